@@ -1,24 +1,54 @@
 # api.py
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from har_utils import HARPredictor
-import joblib
-import pandas as pd
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
+from har_utils import FS, FEATURE_DTYPE, FEATURE_PIPELINE_VERSION, hann_taper, rfft_bins, window_count
+from har_executor import get_default_executor
+from har_stream import StreamFeatureExtractor, decode_samples
+from har_io import SUPPORTED_EXTENSIONS, count_samples, iter_file_chunks
+from har_jobs import JobManager, DONE, FAILED, FINISHED
+from har_metrics import metrics
+from har_model import load_predictor
+from har_cache import file_digest, get_result_cache
+from har_window_cache import get_window_cache
+from har_bulk import BULK_MAX_FILES, expand_upload, is_archive, predict_bulk
+from har_scheduler import InferenceScheduler, SchedulerSaturated
+from har_preview import PREVIEW_COLUMNS, PREVIEW_MAX_POINTS, PREVIEW_POINTS, SignalPyramid, get_preview_store
+from har_profiler import get_profiler
+import os
+import base64
+import hmac
 import numpy as np
-from io import StringIO, BytesIO
+import json
 import traceback
-from scipy.signal import medfilt, butter, filtfilt
-from scipy.fft import rfft, rfftfreq
-from scipy.stats import skew, kurtosis
-import openpyxl
-from collections import Counter
+import time
+import asyncio
+from contextlib import asynccontextmanager, closing, contextmanager
+from io import BytesIO
+from typing import List
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP:
+        # in the background, so /api/health can answer 503 while the pipeline warms up
+        asyncio.get_running_loop().run_in_executor(None, run_warmup)
+    yield
+    job_manager.shutdown()
+    feature_executor.shutdown()
+    scheduler.shutdown()
 
 
 app = FastAPI(
     title="HAR API",
     description="Human Activity Recognition API for motion analysis",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 
@@ -30,215 +60,378 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+MAX_FILE_SIZE = int(os.environ.get("HAR_MAX_FILE_SIZE", "0"))  # bytes; 0 = unlimited
+
+# Warm-up pushes a synthetic recording through the whole pipeline at startup;
+# /api/health reports 503 until it has finished
+WARMUP = os.environ.get("HAR_WARMUP", "1") != "0"
+WARMUP_SAMPLES = int(os.environ.get("HAR_WARMUP_SAMPLES", "512"))
+warmup_state = {"ready": not WARMUP, "error": None}
 
+# Optional parts of an analysis response, chosen with ?include=; the summary
+# (activity, confidence, probabilities, distribution, meta) is always returned
+RESPONSE_SECTIONS = ("predictions", "timeline", "signals", "fft", "overview")
+DEFAULT_SECTIONS = ("predictions", "signals", "fft")
+ARRAY_ENCODINGS = ("json", "base64")
+ResultResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+
+MODEL_ARTIFACT = os.environ.get("HAR_MODEL_ARTIFACT", "har_model_artifact")
+MODEL_PICKLE = os.environ.get("HAR_MODEL_PICKLE", "har_predictor_complete.pkl")
+# Scaler folded into the linear SVM weights; HAR_COMPILED_INFERENCE=0 unpickles and uses sklearn directly
+COMPILED_INFERENCE = os.environ.get("HAR_COMPILED_INFERENCE", "1") != "0"
 
 try:
-    predictor = joblib.load('har_predictor_complete.pkl')
+    predictor = load_predictor(MODEL_ARTIFACT, MODEL_PICKLE, compiled=COMPILED_INFERENCE)
     print(" HAR Model loaded successfully!")
-    print(f"Scaler expects {predictor.scaler.n_features_in_} features")
+    print(f"Model expects {predictor.n_features_in_} features ({type(predictor).__name__})")
 except Exception as e:
     print(f" Failed to load model: {e}")
     raise e
 
-FS = 50        # Hz
-WIN_S = 128    # 2.56 s window
-
-def butter_lowpass_filter(data, cutoff, fs=FS, order=3):
-    nyq = 0.5 * fs
-    b, a = butter(order, cutoff / nyq, btype='low')
-    return filtfilt(b, a, data, axis=0)
-
-def median_filter(data, kernel_size=3):
-    if data.ndim == 1:
-        return medfilt(data, kernel_size)
-    out = np.zeros_like(data)
-    for ax in range(data.shape[1]):
-        out[:, ax] = medfilt(data[:, ax], kernel_size)
-    return out
-
-def compute_gravity(total_acc):
-    return butter_lowpass_filter(total_acc, 0.3, order=4)
-
-def compute_body_acc(total_acc):
-    gravity = compute_gravity(total_acc)
-    return total_acc - gravity
-
-def compute_jerk(signal):
-    return np.gradient(signal, axis=0) * FS
-
-def magnitude(signal):
-    return np.sqrt(np.sum(signal**2, axis=1))
-
-def ar_coeffs_lstsq(x, order=4):
-    x = np.asarray(x).flatten()
-    N = x.size
-    if N <= order:
-        return [0.0] * order
-    Y = x[order:]
-    X = np.column_stack([x[order - k: N - k] for k in range(1, order + 1)])
-    coeffs, *_ = np.linalg.lstsq(X, Y, rcond=None)
-    return coeffs.flatten().tolist()
-
-def signal_entropy(x, bins=30):
-    hist, _ = np.histogram(x, bins=bins, density=True)
-    hist = hist[hist > 0]
-    entropy = -np.sum(hist * np.log2(hist + 1e-12))
-    return entropy if np.isfinite(entropy) else 0.0
-
-def time_domain_features(sig):
-    sig = np.asarray(sig, dtype=float)
-    
-    if np.all(sig == sig[0]):
-        return [0.0] * 16
-    
-    mean = sig.mean()
-    std = sig.std()
-    mad = np.median(np.abs(sig - np.median(sig)))
-    maxi = sig.max()
-    mini = sig.min()
-    sma = np.mean(np.abs(sig))
-    energy = np.sum(sig**2) / (sig.size + 1e-12)
-    iqr = np.percentile(sig, 75) - np.percentile(sig, 25)
-    ent = signal_entropy(sig)
-    ar = ar_coeffs_lstsq(sig, order=4)
-    sk = skew(sig, nan_policy='omit')
-    kt = kurtosis(sig, nan_policy='omit')
-    
-    features = [mean, std, mad, maxi, mini, sma, energy, iqr, ent] + ar + [sk, kt]
-    return [0.0 if not np.isfinite(f) else f for f in features]
+model_fingerprint = predictor.fingerprint()
+# Inference for every request and stream goes through one micro-batching queue
+scheduler = InferenceScheduler(predictor)
+# Pruned artifacts name the feature columns they use; only those are computed
+feature_columns = getattr(predictor, "feature_columns", None)
+result_cache = get_result_cache()
+window_cache = get_window_cache()
+preview_store = get_preview_store()
+profiler = get_profiler()
 
-def freq_domain_features(sig, fs=FS):
-    N = len(sig)
-    if N == 0:
-        return [0.0] * 12
-    
-    fft_vals = rfft(sig * np.hanning(N))
-    psd = np.abs(fft_vals)**2
-    freqs = rfftfreq(N, 1/fs)
-    
-    if psd.sum() == 0:
-        return [0.0] * 12
-    
-    psd_sum = psd.sum() + 1e-12
-    meanFreq = (freqs * psd).sum() / psd_sum
-    maxFreq = freqs[np.argmax(psd)] if psd.max() > 0 else 0.0
-    sk = skew(psd, nan_policy='omit')
-    kt = kurtosis(psd, nan_policy='omit')
-    
-    nbands = 8
-    band_edges = np.linspace(0, len(psd), nbands + 1, dtype=int)
-    bands = [psd[band_edges[i]:band_edges[i+1]].sum() for i in range(nbands)]
-    
-    features = [meanFreq, maxFreq, sk, kt] + bands
-    return [0.0 if not np.isfinite(f) else f for f in features]
-
-def features_from_window(signals_dict):
-    fv = []
-    tri_signals = ['tBodyAcc','tGravityAcc','tBodyAccJerk','tBodyGyro','tBodyGyroJerk']
-    for name in tri_signals:
-        X = signals_dict[name]
-        for ax in range(3):
-            s = X[:, ax]
-            fv += time_domain_features(s)
-            fv += freq_domain_features(s)
-    
-    mag_signals = ['tBodyAccMag','tGravityAccMag','tBodyAccJerkMag','tBodyGyroMag','tBodyGyroJerkMag']
-    for m in mag_signals:
-        s = signals_dict[m]
-        fv += time_domain_features(s)
-        fv += freq_domain_features(s)
-    
-    fv_array = np.array(fv)
-    if np.any(~np.isfinite(fv_array)):
-        fv_array[~np.isfinite(fv_array)] = 0.0
-    
-    return fv_array
+feature_executor = get_default_executor()
 
-def process_single_window(tAcc_window, gyro_window):
-    """Process a single window of data (128 time steps, 3 axes)"""
-    
-    tAccJerk = compute_jerk(tAcc_window)
-    gyroJerk = compute_jerk(gyro_window)
-    
-    tAccMag = magnitude(tAcc_window)
-    gravityMag = magnitude(compute_gravity(tAcc_window))
-    tAccJerkMag = magnitude(tAccJerk)
-    gyroMag = magnitude(gyro_window)
-    gyroJerkMag = magnitude(gyroJerk)
-    
-    signals_win = {
-        'tBodyAcc': tAcc_window,
-        'tGravityAcc': compute_gravity(tAcc_window),
-        'tBodyAccJerk': tAccJerk,
-        'tBodyGyro': gyro_window,
-        'tBodyGyroJerk': gyroJerk,
-        'tBodyAccMag': tAccMag,
-        'tGravityAccMag': gravityMag,
-        'tBodyAccJerkMag': tAccJerkMag,
-        'tBodyGyroMag': gyroMag,
-        'tBodyGyroJerkMag': gyroJerkMag
-    }
-    
-    return features_from_window(signals_win)
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count requests and time them per matched route"""
+    if not metrics.enabled:
+        return await call_next(request)
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    metrics.inc("har_requests_total", path=path, status=response.status_code)
+    metrics.observe("har_request_seconds", time.perf_counter() - start, path=path)
+    return response
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Prometheus text-format metrics"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/api/health")
-async def health_check():
-    """Health check endpoint"""
-    return {"ok": True, "status": "running", "model_loaded": predictor is not None}
+async def health_check(response: Response):
+    """Health check endpoint (503 until the startup warm-up has run)"""
+    if not warmup_state["ready"]:
+        response.status_code = 503
+        status = "warmup_failed" if warmup_state["error"] else "warming_up"
+        return {"ok": False, "status": status, "model_loaded": predictor is not None, "error": warmup_state["error"]}
+    return {"ok": True, "status": "running", "model_loaded": predictor is not None, "queue": scheduler.status()}
 
-def parse_file_content(contents: bytes, filename: str):
-    """Parse uploaded file content based on file extension"""
+@contextmanager
+def admitted():
+    """Hold an inference slot; 429/503 with Retry-After when the scheduler is saturated"""
     try:
-        # Try Excel first if .xlsx
-        if filename.lower().endswith('.xlsx'):
-            df = pd.read_excel(BytesIO(contents), header=None)
-            return df
-        
-        # Try space-separated (common for .txt files)
-        try:
-            data = pd.read_csv(StringIO(contents.decode()), delim_whitespace=True, header=None)
-            return data
-        except:
-            pass
-        
-        # Try CSV with headers
-        try:
-            data = pd.read_csv(StringIO(contents.decode()))
-            return data
-        except:
-            pass
-        
-        # Try CSV without headers
-        try:
-            data = pd.read_csv(StringIO(contents.decode()), header=None)
-            return data
-        except:
-            pass
-        
-        raise ValueError("Unable to parse file. Ensure it's a valid CSV, TXT, or XLSX file.")
-    
-    except Exception as e:
-        raise ValueError(f"File parsing error: {str(e)}")
+        scheduler.acquire()
+    except SchedulerSaturated as e:
+        raise HTTPException(status_code=e.status, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+    try:
+        yield
+    finally:
+        scheduler.release()
 
 def compute_fft_preview(signal, fs=50, max_samples=500):
     """Compute FFT for preview (limited samples for performance)"""
+    from scipy.fft import rfft
     if len(signal) > max_samples:
         signal = signal[:max_samples]
     
     N = len(signal)
-    fft_vals = rfft(signal * np.hanning(N))
+    fft_vals = rfft(signal * hann_taper(N))
     magnitude = np.abs(fft_vals)
-    freqs = rfftfreq(N, 1/fs)
+    freqs = rfft_bins(N, fs)
     
-    return freqs.tolist(), magnitude.tolist()
+    return freqs, magnitude
+
+def parse_response_options(include, encoding):
+    """Validated (sections, encoding) from the include= / encoding= query parameters"""
+    sections = DEFAULT_SECTIONS if include is None else tuple(s for s in include.split(",") if s.strip())
+    sections = tuple(s.strip() for s in sections)
+    unknown = sorted(set(sections) - set(RESPONSE_SECTIONS))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include section(s) {', '.join(unknown)}. "
+                                                    f"Allowed: {', '.join(RESPONSE_SECTIONS)}")
+    if encoding not in ARRAY_ENCODINGS:
+        raise HTTPException(status_code=400, detail=f"Unknown encoding {encoding}. Allowed: {', '.join(ARRAY_ENCODINGS)}")
+    return frozenset(sections), encoding
+
+def encode_array(values, encoding="json"):
+    """Numeric array as a JSON list, or as base64 little-endian float32"""
+    values = np.asarray(values)
+    if encoding == "base64":
+        data = np.ascontiguousarray(values, dtype="<f4")
+        return {"dtype": "float32", "shape": list(data.shape), "data": base64.b64encode(data).decode("ascii")}
+    return values.tolist()
+
+def encode_arrays(tree, encoding="json"):
+    """encode_array applied to every array in a nest of dicts"""
+    if isinstance(tree, dict):
+        return {k: encode_arrays(v, encoding) for k, v in tree.items()}
+    return encode_array(tree, encoding) if isinstance(tree, np.ndarray) else tree
+
+def overview_section(pyramid, encoding="json", preview_id=None):
+    """Whole-recording envelope and spectrogram, plus the preview_id to zoom into them"""
+    return {
+        "preview_id": preview_store.put(pyramid, preview_id),
+        "samples": pyramid.n_samples,
+        "duration_s": pyramid.duration,
+        "signals": encode_arrays(pyramid.envelope(points=PREVIEW_POINTS), encoding),
+        "spectrogram": encode_arrays(pyramid.spectrogram(columns=PREVIEW_COLUMNS), encoding),
+    }
+
+def activity_name(pred):
+    """Display name of a predicted class"""
+    if hasattr(predictor, 'activity_mapping'):
+        return predictor.activity_mapping.get(pred, f"Unknown_{pred}")
+    return f"Activity_{pred}"
+
+def rle_timeline(labels, label_name, window, hop, fs=FS):
+    """Window predictions as runs of [activity, first window, window count]"""
+    labels = np.asarray(labels)
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]]) if len(labels) else np.array([], dtype=int)
+    counts = np.diff(np.r_[starts, len(labels)])
+    runs = [[label_name(label), start, count]
+            for label, start, count in zip(labels[starts].tolist(), starts.tolist(), counts.tolist())]
+    return {"window_s": window / fs, "hop_s": hop / fs, "runs": runs}
+
+def _parsed(chunks):
+    """Time each parse step of a chunk iterator; re-raise parse failures as 400s"""
+    chunks = iter(chunks)
+    try:
+        while True:
+            with metrics.stage("parse"):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+def build_result(labels, n_samples, filename, proba_sum=None, preview=None, sections=frozenset(DEFAULT_SECTIONS),
+                 encoding="json", names=None, overview=None, window=128, hop=64):
+    """Response dict for a classified recording
+
+    labels are the per-window predictions, proba_sum their summed class
+    probabilities and preview the first samples (for the signals and fft
+    sections). names, if given, are the labels already turned into names;
+    overview is an already built overview section.
+    """
+    n_windows = len(labels)
+    
+    # Get probabilities if available
+    probabilities_data = None
+    confidence_score = 0.0
+
+    if proba_sum is not None:
+        # Average probabilities across all windows
+        avg_proba = proba_sum / n_windows
+        confidence_score = float(np.max(avg_proba))
+
+        # Map to activity names
+        if hasattr(predictor, 'activity_mapping'):
+            class_labels = [predictor.activity_mapping.get(c, f"Activity_{c}") 
+                           for c in predictor.classes_]
+            probabilities_data = {label: float(prob) for label, prob in zip(class_labels, avg_proba)}
+
+    # Distribution in order of first appearance; the most common activity
+    # wins, ties going to the one seen first
+    uniq, first, counts = np.unique(labels, return_index=True, return_counts=True)
+    order = np.argsort(first)
+    distribution = {activity_name(uniq[i]): int(counts[i]) for i in order}
+    most_common_activity = activity_name(uniq[min(order, key=lambda i: -counts[i])])
+
+    # Metadata
+    meta = {
+        "samples": int(n_samples),
+        "channels": 6,
+        "sampling_rate": FS,
+        "windows_analyzed": n_windows,
+        "filename": filename
+    }
+
+    result = {
+        "activity": most_common_activity,
+        "confidence": confidence_score,
+        "probabilities": probabilities_data,
+        "meta": meta,
+        "prediction_distribution": distribution,
+    }
+
+    # Generate signal preview (first window)
+    if "signals" in sections:
+        result["signals_preview"] = {
+            "t": encode_array(np.arange(len(preview)) / FS, encoding),
+            **{name: encode_array(preview[:, i], encoding) for i, name in
+               enumerate(("acc_x", "acc_y", "acc_z", "gyro_x", "gyro_y", "gyro_z"))},
+        }
+
+    # Generate FFT preview
+    if "fft" in sections:
+        freq, mag_x = compute_fft_preview(preview[:, 0])
+        result["fft_preview"] = {
+            "freq": encode_array(freq, encoding),
+            "mag_acc_x": encode_array(mag_x, encoding),
+            "mag_acc_y": encode_array(compute_fft_preview(preview[:, 1])[1], encoding),
+            "mag_acc_z": encode_array(compute_fft_preview(preview[:, 2])[1], encoding),
+        }
+
+    if "predictions" in sections:
+        result["all_predictions"] = names if names is not None else list(map(activity_name, labels.tolist()))
+    if "timeline" in sections:
+        result["timeline"] = rle_timeline(labels, activity_name, window, hop)
+    if overview is not None:
+        result["overview"] = overview
+    return result
+
+def analyze_recording(chunks, filename: str, source="upload", on_progress=None,
+                      sections=frozenset(DEFAULT_SECTIONS), encoding="json", preview_id=None):
+    """Featurize and classify a recording chunk by chunk as it is parsed (CPU-bound; runs off the event loop)
+
+    chunks yields (rows, channels) arrays; only the current chunk, the unfinished
+    window tail and the per-window labels are kept, so memory does not grow with
+    the recording length beyond one label per window. on_progress(labels) is
+    called with the labels so far after every classified chunk. sections
+    picks the optional parts of the response (see RESPONSE_SECTIONS) and
+    encoding how their numeric arrays are written. The overview's pyramid
+    is the one thing that grows with the recording; it is stored under
+    preview_id (a new id by default).
+    """
+    # Window segmentation + feature extraction
+    window_size = 128
+    overlap = 64
+    stream = StreamFeatureExtractor(window_size, window_size - overlap, executor=feature_executor, cache=window_cache,
+                                    columns=feature_columns)
+    
+    activity_names = []
+    label_chunks = []
+    proba_sum = None
+    preview_samples = 256 if sections & {"signals", "fft"} else 0
+    preview = np.zeros((0, 6))
+    pyramid = SignalPyramid() if "overview" in sections else None   # grown chunk by chunk
+    
+    with closing(_parsed(chunks)) as parsed:   # closed promptly even if a check below raises
+        for chunk in parsed:
+            if chunk.shape[1] < 6:
+                raise HTTPException(
+                    status_code=400, 
+                    detail=f"Expected at least 6 columns (acc_x, acc_y, acc_z, gyro_x, gyro_y, gyro_z). Got {chunk.shape[1]} columns."
+                )
+            chunk = chunk[:, :6]
+            if len(preview) < preview_samples:
+                preview = np.concatenate([preview, chunk[:preview_samples - len(preview)]])
+            if pyramid is not None:
+                pyramid.append(chunk)
+        
+            with metrics.stage("features"):
+                features = stream.push(chunk)
+            if len(features) == 0:
+                continue
+        
+            # Validate feature dimensions
+            if features.shape[1] != predictor.n_features_in_:
+                raise HTTPException(
+                    status_code=500, 
+                    detail=f"Feature extraction error: Got {features.shape[1]} features, expected {predictor.n_features_in_}"
+                )
+        
+            # Predict (scaling, SVM votes and probabilities in one pass, batched with other requests)
+            features = np.nan_to_num(features, nan=0.0)
+            predictions, proba = scheduler.predict_and_proba(features)
+            metrics.inc("har_windows_processed_total", len(predictions), source=source)
+        
+            # Accumulate probabilities if available
+            if proba is not None:
+                proba = proba.sum(axis=0)
+                proba_sum = proba if proba_sum is None else proba_sum + proba
+        
+            # Keep the raw labels; names are only materialized when someone reads them
+            label_chunks.append(predictions)
+            if on_progress is not None:
+                activity_names.extend(map(activity_name, predictions))
+                on_progress(activity_names)
+    
+    if stream.total == 0:
+        raise HTTPException(status_code=400, detail="Empty file uploaded")
+    
+    if stream.total < window_size:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Insufficient data. Need at least {window_size} samples."
+        )
+    
+    # Build response
+    with metrics.stage("response"):
+        overview = overview_section(pyramid.finish(), encoding, preview_id) if pyramid is not None else None
+        return build_result(np.concatenate(label_chunks), stream.total, filename, proba_sum, preview, sections, encoding,
+                            names=activity_names if on_progress is not None else None, overview=overview)
+
+def run_warmup(n_samples=WARMUP_SAMPLES):
+    """Run a synthetic walking recording through parsing, features, inference and the response builder.
+
+    Pays for the deferred pandas/scipy imports, DSP constant caches and FFT
+    plans before the first real request does.
+    """
+    try:
+        start = time.perf_counter()
+        from generate_sample_data import generate_walking_data
+        buf = BytesIO()
+        np.savetxt(buf, np.column_stack(generate_walking_data(n_samples)), delimiter=',')
+        # every section but the overview, whose pyramid would take up room in the preview store
+        ResultResponse(analyze_recording(iter_file_chunks(buf, "warmup.csv"), "warmup.csv", source="warmup",
+                                         sections=frozenset(RESPONSE_SECTIONS) - {"overview"}))
+        warmup_state["ready"] = True
+        print(f" Warm-up finished in {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        warmup_state["error"] = str(e)
+        print(f" Warm-up failed: {e}")
+        print(traceback.format_exc())
+
+def require_admin(request: Request):
+    """404 unless profiling is enabled (it needs an admin token); 403 without the admin token"""
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled (HAR_PROFILING=1 enables it)")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", ""), profiler.token):
+        raise HTTPException(status_code=403, detail="Invalid or missing X-Admin-Token")
+
+def profiling_requested(request: Request):
+    """True when the caller asked for a profile (?profile=1 or X-HAR-Profile: 1) and may have one"""
+    if not profiler.enabled:
+        return False
+    flag = request.query_params.get("profile") or request.headers.get("x-har-profile")
+    if flag not in ("1", "true"):
+        return False
+    require_admin(request)
+    return True
 
 @app.post("/api/predict")
-async def predict_activity(file: UploadFile = File(...)):
-    """Main prediction endpoint"""
+async def predict_activity(request: Request, file: UploadFile = File(...), include: str = None, encoding: str = "json"):
+    """Main prediction endpoint
+
+    include: comma-separated optional sections (predictions, timeline, signals, fft);
+    encoding=base64 sends preview arrays as base64 float32 instead of JSON lists.
+    With profiling enabled, ?profile=1 (or X-HAR-Profile: 1) profiles the analysis
+    and returns the profile id in X-Profile-Id.
+    """
     try:
+        sections, encoding = parse_response_options(include, encoding)
+        profile = profiling_requested(request)
+        
         # Validate file extension
-        allowed_extensions = ['.csv', '.txt', '.xlsx']
+        allowed_extensions = SUPPORTED_EXTENSIONS
         file_ext = '.' + file.filename.split('.')[-1].lower() if '.' in file.filename else ''
         
         if file_ext not in allowed_extensions:
@@ -247,144 +440,51 @@ async def predict_activity(file: UploadFile = File(...)):
                 detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
             )
         
-        # Read file content
-        contents = await file.read()
-        
-        # Check file size
-        if len(contents) > MAX_FILE_SIZE:
+        # Check file size (the multipart parser has already spooled the body to disk)
+        if MAX_FILE_SIZE and file.size is not None and file.size > MAX_FILE_SIZE:
             raise HTTPException(
                 status_code=400, 
                 detail=f"File too large. Maximum size: {MAX_FILE_SIZE / 1024 / 1024}MB"
             )
         
-        if len(contents) == 0:
+        if file.size == 0:
             raise HTTPException(status_code=400, detail="Empty file uploaded")
+        metrics.inc("har_bytes_ingested_total", file.size or 0, source="upload")
         
-        # Parse file
-        data = parse_file_content(contents, file.filename)
-        
-        if data.shape[1] < 6:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Expected at least 6 columns (acc_x, acc_y, acc_z, gyro_x, gyro_y, gyro_z). Got {data.shape[1]} columns."
-            )
-        
-        # Extract sensor data
-        sensor_data = data.values
-        
-        # Window segmentation
-        window_size = 128
-        overlap = 64
-        
-        acc_windows = []
-        gyro_windows = []
-        
-        for i in range(0, len(sensor_data) - window_size + 1, window_size - overlap):
-            window = sensor_data[i:i+window_size]
-            acc_window = window[:, :3]  
-            gyro_window = window[:, 3:6]
-            
-            acc_windows.append(acc_window)
-            gyro_windows.append(gyro_window)
-        
-        if len(acc_windows) == 0:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Insufficient data. Need at least {window_size} samples."
-            )
-        
-        # Feature extraction
-        features = []
-        for acc_win, gyro_win in zip(acc_windows, gyro_windows):
-            window_features = process_single_window(acc_win, gyro_win)
-            features.append(window_features)
-        
-        features = np.array(features)
-        
-        # Validate feature dimensions
-        if features.shape[1] != predictor.scaler.n_features_in_:
-            raise HTTPException(
-                status_code=500, 
-                detail=f"Feature extraction error: Got {features.shape[1]} features, expected {predictor.scaler.n_features_in_}"
-            )
-        
-        # Predict
-        features = np.nan_to_num(features, nan=0.0)
-        features_scaled = predictor.scaler.transform(features)
-        predictions = predictor.model.predict(features_scaled)
-        
-        # Get probabilities if available
-        probabilities_data = None
-        confidence_score = 0.0
-        
-        if hasattr(predictor.model, 'predict_proba'):
-            proba = predictor.model.predict_proba(features_scaled)
-            # Average probabilities across all windows
-            avg_proba = np.mean(proba, axis=0)
-            confidence_score = float(np.max(avg_proba))
-            
-            # Map to activity names
-            if hasattr(predictor, 'activity_mapping'):
-                class_labels = [predictor.activity_mapping.get(i, f"Activity_{i}") 
-                               for i in range(len(avg_proba))]
-                probabilities_data = {label: float(prob) for label, prob in zip(class_labels, avg_proba)}
-        
-        # Get activity names
-        if hasattr(predictor, 'activity_mapping'):
-            activity_names = [predictor.activity_mapping.get(pred, f"Unknown_{pred}") 
-                            for pred in predictions]
-        else:
-            activity_names = [f"Activity_{pred}" for pred in predictions]
+        loop = asyncio.get_running_loop()
         
-        # Determine most common activity
-        activity_counter = Counter(activity_names)
-        most_common_activity = activity_counter.most_common(1)[0][0]
+        # Identical upload + model + pipeline: return the stored response
+        cache_key = preview_id = None
+        if result_cache.enabled and not profile:
+            digest = await loop.run_in_executor(None, file_digest, file.file)
+            cache_key = result_cache.key(digest, file.filename, model_fingerprint, FEATURE_PIPELINE_VERSION, FEATURE_DTYPE.name,
+                                         ",".join(sorted(sections)), encoding)
+            # an overview's preview id comes from the cache key, so a stored response
+            # is only served while the pyramid it points at is still there (or when
+            # the pyramid was too large to keep and the response has no preview)
+            if "overview" in sections:
+                preview_id = cache_key[:32]
+            if preview_id is None or preview_store.reusable(preview_id):
+                cached = result_cache.get(cache_key)
+                if cached is not None:
+                    return Response(cached, media_type="application/json", headers={"X-Cache": "hit"})
         
-        # Generate signal preview (first window)
-        preview_samples = min(256, len(sensor_data))
-        time_axis = (np.arange(preview_samples) / FS).tolist()
-        
-        signals_preview = {
-            "t": time_axis,
-            "acc_x": sensor_data[:preview_samples, 0].tolist(),
-            "acc_y": sensor_data[:preview_samples, 1].tolist(),
-            "acc_z": sensor_data[:preview_samples, 2].tolist(),
-            "gyro_x": sensor_data[:preview_samples, 3].tolist(),
-            "gyro_y": sensor_data[:preview_samples, 4].tolist(),
-            "gyro_z": sensor_data[:preview_samples, 5].tolist(),
-        }
-        
-        # Generate FFT preview
-        freq_x, mag_x = compute_fft_preview(sensor_data[:preview_samples, 0])
-        freq_y, mag_y = compute_fft_preview(sensor_data[:preview_samples, 1])
-        freq_z, mag_z = compute_fft_preview(sensor_data[:preview_samples, 2])
-        
-        fft_preview = {
-            "freq": freq_x,
-            "mag_acc_x": mag_x,
-            "mag_acc_y": mag_y,
-            "mag_acc_z": mag_z,
-        }
-        
-        # Metadata
-        meta = {
-            "samples": int(len(sensor_data)),
-            "channels": 6,
-            "sampling_rate": FS,
-            "windows_analyzed": len(predictions),
-            "filename": file.filename
-        }
-        
-        return {
-            "activity": most_common_activity,
-            "confidence": confidence_score,
-            "probabilities": probabilities_data,
-            "meta": meta,
-            "signals_preview": signals_preview,
-            "fft_preview": fft_preview,
-            "all_predictions": activity_names,
-            "prediction_distribution": dict(activity_counter)
-        }
+        # Parse, featurize and classify chunk by chunk off the event loop
+        chunks = iter_file_chunks(file.file, file.filename)
+        analyze = lambda: analyze_recording(chunks, file.filename, sections=sections, encoding=encoding,
+                                            preview_id=preview_id)
+        with admitted():
+            if profile:
+                # profiled on the worker thread that does the parsing and feature work
+                result, profile_id = await loop.run_in_executor(None, profiler.run, analyze,
+                                                                {"route": "/api/predict", "filename": file.filename})
+                return ResultResponse(result, headers={"X-Profile-Id": profile_id})
+            result = await loop.run_in_executor(None, analyze)
+        if cache_key is None:
+            return ResultResponse(result)
+        response = ResultResponse(result, headers={"X-Cache": "miss"})
+        result_cache.put(cache_key, response.body)
+        return response
         
     except HTTPException:
         raise
@@ -393,6 +493,256 @@ async def predict_activity(file: UploadFile = File(...)):
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
 
+def bulk_features(data, window=128, hop=64):
+    return StreamFeatureExtractor(window, hop, executor=feature_executor, cache=window_cache,
+                                  columns=feature_columns).push(data)
+
+@app.post("/api/predict/bulk")
+async def predict_bulk_activity(files: List[UploadFile] = File(...)):
+    """Classify many recordings (and zip/tar archives of them) with one inference call"""
+    recordings = []
+    for file in files:
+        file_ext = '.' + file.filename.split('.')[-1].lower() if '.' in file.filename else ''
+        if file_ext not in SUPPORTED_EXTENSIONS and not is_archive(file.filename):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported file type for {file.filename}. Allowed: {', '.join(SUPPORTED_EXTENSIONS)} or archives"
+            )
+        if MAX_FILE_SIZE and file.size is not None and file.size > MAX_FILE_SIZE:
+            raise HTTPException(status_code=400, detail=f"File {file.filename} too large. Maximum size: {MAX_FILE_SIZE / 1024 / 1024}MB")
+        metrics.inc("har_bytes_ingested_total", file.size or 0, source="bulk")
+        try:
+            recordings.extend(expand_upload(await file.read(), file.filename))
+        except (ValueError, OSError) as e:
+            raise HTTPException(status_code=400, detail=f"Could not read {file.filename}: {e}")
+    if not recordings:
+        raise HTTPException(status_code=400, detail="No recordings found in upload")
+    if len(recordings) > BULK_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many recordings ({len(recordings)}); limit is {BULK_MAX_FILES}")
+    
+    loop = asyncio.get_running_loop()
+    with admitted():
+        try:
+            return ResultResponse(await loop.run_in_executor(None, predict_bulk, recordings, scheduler, bulk_features))
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            print(traceback.format_exc())
+            raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+
+def get_preview_or_404(preview_id):
+    pyramid = preview_store.get(preview_id)
+    if pyramid is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired preview {preview_id}; re-upload with include=overview")
+    return pyramid
+
+def preview_range(pyramid, start, end, points):
+    """Sample range for start/end seconds, validated along with the point budget"""
+    if not 1 <= points <= PREVIEW_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"points must be between 1 and {PREVIEW_MAX_POINTS}")
+    first = int(start * FS)
+    last = pyramid.n_samples if end is None else int(np.ceil(end * FS))
+    if first < 0 or first >= min(last, pyramid.n_samples):
+        raise HTTPException(status_code=400, detail=f"Empty range; the recording is {pyramid.duration:.2f}s long")
+    return first, last
+
+@app.get("/api/previews/{preview_id}")
+async def get_preview(preview_id: str, start: float = 0.0, end: float = None, points: int = PREVIEW_POINTS,
+                      mode: str = "minmax", encoding: str = "json"):
+    """Signals between start and end seconds in at most `points` points per channel
+
+    mode=minmax returns the min/max envelope of each bucket; mode=lttb one
+    shape-preserving point per bucket per channel.
+    """
+    pyramid = get_preview_or_404(preview_id)
+    _, encoding = parse_response_options("", encoding)
+    first, last = preview_range(pyramid, start, end, points)
+    if mode == "minmax":
+        data = pyramid.envelope(first, last, points)
+    elif mode == "lttb":
+        data = pyramid.downsample(first, last, points)
+    else:
+        raise HTTPException(status_code=400, detail=f"Unknown mode {mode}. Allowed: minmax, lttb")
+    return ResultResponse({"preview_id": preview_id, "mode": mode, "start_s": first / FS,
+                           "end_s": min(last, pyramid.n_samples) / FS, **encode_arrays(data, encoding)})
+
+@app.get("/api/previews/{preview_id}/spectrogram")
+async def get_preview_spectrogram(preview_id: str, start: float = 0.0, end: float = None,
+                                  columns: int = PREVIEW_COLUMNS, encoding: str = "json"):
+    """Acceleration-magnitude spectrogram between start and end seconds, at most `columns` frames"""
+    pyramid = get_preview_or_404(preview_id)
+    _, encoding = parse_response_options("", encoding)
+    first, last = preview_range(pyramid, start, end, columns)
+    return ResultResponse({"preview_id": preview_id, "start_s": first / FS, "end_s": min(last, pyramid.n_samples) / FS,
+                           **encode_arrays(pyramid.spectrogram(first, last, columns), encoding)})
+
+@app.get("/api/admin/profiles")
+async def list_profiles(request: Request):
+    """Stored request profiles, newest first"""
+    require_admin(request)
+    return {"profiles": profiler.list()}
+
+def get_profile_or_404(request, profile_id):
+    require_admin(request)
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired profile {profile_id}")
+    return profile
+
+@app.get("/api/admin/profiles/{profile_id}")
+async def get_profile(request: Request, profile_id: str):
+    """Time per project function (cumulative) and the top self-time hotspots"""
+    return get_profile_or_404(request, profile_id).summary(detail=True)
+
+@app.get("/api/admin/profiles/{profile_id}/download")
+async def download_profile(request: Request, profile_id: str):
+    """The raw profile, for pstats / snakeviz"""
+    profile = get_profile_or_404(request, profile_id)
+    return Response(profile.dump(), media_type="application/octet-stream",
+                    headers={"Content-Disposition": f'attachment; filename="{profile_id}.prof"'})
+
+def run_job(job, fileobj):
+    # jobs are already bounded by the job pool; count them so their windows get batched too
+    with scheduler.admit(limit=False):
+        return analyze_recording(iter_file_chunks(fileobj, job.filename), job.filename, source="job",
+                                 on_progress=job.progress, **job.options)
+
+def count_windows(fileobj, filename, window=128, hop=64):
+    n = count_samples(fileobj, filename)
+    return window_count(n, window, hop)
+
+job_manager = JobManager(run_job)
+
+def get_job_or_404(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+@app.post("/api/jobs", status_code=202)
+async def create_job(file: UploadFile = File(...), include: str = None, encoding: str = "json"):
+    """Queue a recording for background analysis; poll /api/jobs/{id} for progress"""
+    sections, encoding = parse_response_options(include, encoding)
+    file_ext = '.' + file.filename.split('.')[-1].lower() if '.' in file.filename else ''
+    if file_ext not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Unsupported file type. Allowed: {', '.join(SUPPORTED_EXTENSIONS)}"
+        )
+    if file.size == 0:
+        raise HTTPException(status_code=400, detail="Empty file uploaded")
+    metrics.inc("har_bytes_ingested_total", file.size or 0, source="job")
+    
+    loop = asyncio.get_running_loop()
+    job = await loop.run_in_executor(None, job_manager.submit, file.file, file.filename, count_windows,
+                                     {"sections": sections, "encoding": encoding})
+    return {
+        **job.summary(),
+        "status_url": f"/api/jobs/{job.id}",
+        "result_url": f"/api/jobs/{job.id}/result",
+        "stream_url": f"/api/jobs/{job.id}/stream",
+    }
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, offset: int = None):
+    """Job status; with ?offset=N also the window predictions from N on (partial results)"""
+    return get_job_or_404(job_id).summary(offset)
+
+@app.get("/api/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """Full /api/predict-style result of a finished job"""
+    job = get_job_or_404(job_id)
+    if job.status == DONE:
+        return ResultResponse(job.result)
+    if job.status == FAILED:
+        raise HTTPException(status_code=422, detail=job.error)
+    raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+
+@app.get("/api/jobs/{job_id}/stream")
+async def stream_job(job_id: str, interval: float = 0.5):
+    """NDJSON stream of progress events with newly classified windows, ending with the final status"""
+    job = get_job_or_404(job_id)
+    
+    async def events():
+        sent = 0
+        while True:
+            finished = job.status in FINISHED
+            info = job.summary(sent)
+            sent += len(info["predictions"])
+            yield json.dumps(info) + "\n"
+            if finished:
+                break
+            await asyncio.sleep(interval)
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.delete("/api/jobs/{job_id}")
+async def delete_job(job_id: str):
+    """Cancel a queued or running job, or forget a finished one"""
+    job = get_job_or_404(job_id)
+    if job.status in FINISHED:
+        job_manager.remove(job_id)
+    else:
+        job_manager.cancel(job_id)
+    return job.summary()
+
+def predict_window_labels(features):
+    """Activity names for a (n_windows, n_features) matrix"""
+    predictions = scheduler.predict(np.nan_to_num(features, nan=0.0))
+    if hasattr(predictor, 'activity_mapping'):
+        return [predictor.activity_mapping.get(pred, f"Unknown_{pred}") for pred in predictions]
+    return [f"Activity_{pred}" for pred in predictions]
+
+def stream_windows(stream, samples):
+    """Feature rows and labels of the windows `samples` complete (runs in a worker thread)"""
+    with metrics.stage("features"):
+        features = stream.push(samples)
+    if len(features) == 0:
+        return features, []
+    with scheduler.admit(limit=False):
+        return features, predict_window_labels(features)
+
+@app.websocket("/api/stream")
+async def stream_activity(websocket: WebSocket):
+    """Continuous 6-channel stream at FS Hz; one prediction per 64-sample hop"""
+    await websocket.accept()
+    try:
+        scheduler.open_stream()
+    except SchedulerSaturated as e:
+        await websocket.send_json({"error": e.detail, "retry_after": e.retry_after})
+        await websocket.close(code=1013)   # try again later
+        return
+    stream = StreamFeatureExtractor(columns=feature_columns)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            try:
+                with metrics.stage("parse"):
+                    samples = decode_samples(message)
+            except ValueError as e:
+                await websocket.send_json({"error": str(e)})
+                continue
+            metrics.inc("har_bytes_ingested_total", samples.nbytes, source="stream")
+            features, labels = await asyncio.get_running_loop().run_in_executor(None, stream_windows, stream, samples)
+            if len(features) == 0:
+                continue
+            first = stream.emitted - len(features)
+            metrics.inc("har_windows_processed_total", len(labels), source="stream")
+            for k, label in enumerate(labels):
+                start = stream.window_start(first + k)
+                await websocket.send_json({
+                    "window": first + k,
+                    "activity": label,
+                    "t_start": start / FS,
+                    "t_end": (start + stream.window) / FS,
+                    "samples_received": stream.total,
+                })
+    except WebSocketDisconnect:
+        pass
+    finally:
+        scheduler.close_stream()
+
 @app.get("/")
 async def root():
     return {"message": "HAR API is running!", "version": "2.0.0"}
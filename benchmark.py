@@ -0,0 +1,220 @@
+"""
+Benchmark Harness for the HAR Pipeline
+Times each stage of the feature/prediction pipeline (and optionally /api/predict)
+on synthetic recordings, and compares against a saved baseline.
+
+    python benchmark.py --samples 30000 --mix walking:2,sitting:1,standing:1
+    python benchmark.py --save baseline.json
+    python benchmark.py --compare baseline.json --tolerance 0.15 --endpoint
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+import joblib
+import numpy as np
+
+from generate_sample_data import generate_walking_data, generate_sitting_data, generate_standing_data
+from har_io import encode_har_binary, parse_file_content
+from har_model import compile_predictor
+from har_utils import (FEATURE_DTYPE, FS, WIN_S, process_single_window, process_all_pre_segmented_windows,
+                       process_sliding_windows, sliding_windows, window_count)
+
+GENERATORS = {
+    'walking': generate_walking_data,
+    'sitting': generate_sitting_data,
+    'standing': generate_standing_data,
+}
+FORMATS = ('txt', 'csv', 'npy', 'har')
+HOP = WIN_S // 2
+# The endpoint stage re-posts one payload, so the result and window caches would turn every
+# timed call after the first into a cache hit
+ENDPOINT_ENV = {"HAR_RESULT_CACHE": "0", "HAR_WINDOW_CACHE_ENTRIES": "0"}
+
+
+def parse_mix(spec):
+    """'walking:2,sitting:1' -> {'walking': 2.0, 'sitting': 1.0}"""
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition(':')
+        if name not in GENERATORS:
+            raise ValueError(f"Unknown activity: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def generate_recording(n_samples, mix, seed=0):
+    """(n_samples, 6) recording made of contiguous segments, one per activity, sized by weight"""
+    np.random.seed(seed)
+    total = sum(mix.values())
+    sizes = [int(n_samples * w / total) for w in mix.values()]
+    sizes[-1] += n_samples - sum(sizes)
+    return np.concatenate([np.column_stack(GENERATORS[name](size))
+                           for name, size in zip(mix, sizes) if size > 0])
+
+
+def encode_recording(data, fmt):
+    """Upload payload bytes for a recording in one of FORMATS"""
+    if fmt == 'har':
+        return encode_har_binary(data)
+    buf = io.BytesIO()
+    if fmt == 'npy':
+        np.save(buf, data.astype(np.float32))
+    else:
+        np.savetxt(buf, data, delimiter=',' if fmt == 'csv' else ' ', fmt='%.8g')
+    return buf.getvalue()
+
+
+def time_call(fn, repeat, warmup=1):
+    """Wall-clock seconds of `repeat` calls of fn after `warmup` untimed calls; returns (times, last result)"""
+    for _ in range(warmup):
+        result = fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return times, result
+
+
+def summarize(times, n_windows):
+    times = np.asarray(times)
+    p50 = float(np.percentile(times, 50))
+    return {
+        "p50_ms": p50 * 1e3,
+        "p99_ms": float(np.percentile(times, 99)) * 1e3,
+        "mean_ms": float(times.mean()) * 1e3,
+        "windows": n_windows,
+        "windows_per_s": n_windows / p50 if p50 > 0 else float('inf'),
+    }
+
+
+def load_api():
+    """The api module, imported with ENDPOINT_ENV (read at import time)"""
+    os.environ.update(ENDPOINT_ENV)
+    import api
+    return api
+
+
+def run_benchmarks(data, fmt='txt', repeat=10, predictor_path='har_predictor_complete.pkl', endpoint=False):
+    """Per-stage and per-function timings for one recording"""
+    predictor = joblib.load(predictor_path)
+    payload = encode_recording(data, fmt)
+    filename = f"benchmark.{fmt}"
+    n_windows = window_count(len(data), WIN_S, HOP)
+    results = {}
+
+    def stage(name, fn, n_windows):
+        times, result = time_call(fn, repeat)
+        results[name] = summarize(times, n_windows)
+        return result
+
+    # Pipeline stages, each fed the previous stage's output
+    parsed = stage("parse", lambda: parse_file_content(payload, filename), n_windows)
+    sensor = np.asarray(parsed[:, :6], dtype=FEATURE_DTYPE)
+    windows = stage("segment", lambda: sliding_windows(sensor, WIN_S, HOP), n_windows)
+    features = stage("features", lambda: process_sliding_windows(sensor[:, :3], sensor[:, 3:6], WIN_S, HOP), n_windows)
+    features = np.nan_to_num(features, nan=0.0)
+    scaled = stage("scaling", lambda: predictor.scaler.transform(features), n_windows)
+    predictions = stage("svm_predict", lambda: predictor.model.predict(scaled), n_windows)
+    if hasattr(predictor.model, 'predict_proba'):
+        stage("predict_proba", lambda: predictor.model.predict_proba(scaled), n_windows)
+    compiled = compile_predictor(predictor)
+    stage("compiled_predict", lambda: compiled.predict_and_proba(features), n_windows)
+
+    # The response /api/predict builds and encodes (orjson when installed), with every section but the overview
+    api = load_api()
+    proba = compiled.predict_and_proba(features)[1]
+    proba_sum = proba.sum(axis=0) if proba is not None else None
+    sections = frozenset(api.RESPONSE_SECTIONS) - {"overview"}
+    stage("serialize", lambda: api.ResultResponse(api.build_result(predictions, len(sensor), filename, proba_sum,
+                                                                   sensor[:256], sections)).body, n_windows)
+
+    # Public entry points
+    stage("process_single_window", lambda: process_single_window(windows[0, :, :3], windows[0, :, 3:]), 1)
+    stage("process_all_pre_segmented_windows",
+          lambda: process_all_pre_segmented_windows(windows[:, :, :3], windows[:, :, 3:]), n_windows)
+    stage("HARPredictor.predict", lambda: predictor.predict(windows[:, :, :3], windows[:, :, 3:]), n_windows)
+
+    if endpoint:
+        from fastapi.testclient import TestClient
+        with TestClient(api.app) as client:
+            def post():
+                r = client.post('/api/predict', files={'file': (filename, payload)})
+                r.raise_for_status()
+            stage("endpoint", post, n_windows)
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Rows of (name, baseline p50, current p50, ratio, regressed) for stages present in both"""
+    rows = []
+    for name, cur in results.items():
+        old = baseline.get("results", {}).get(name)
+        if old is None:
+            continue
+        ratio = cur["p50_ms"] / old["p50_ms"] if old["p50_ms"] > 0 else float('inf')
+        rows.append((name, old["p50_ms"], cur["p50_ms"], ratio, ratio > 1 + tolerance))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the HAR feature pipeline and prediction endpoint")
+    parser.add_argument("--samples", type=int, default=30000, help=f"recording length in samples ({FS} Hz)")
+    parser.add_argument("--mix", default="walking:1,sitting:1,standing:1", help="activity:weight list")
+    parser.add_argument("--format", choices=FORMATS, default="txt", help="upload format to parse")
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per stage")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--model", default="har_predictor_complete.pkl", help="pickled HARPredictor")
+    parser.add_argument("--endpoint", action="store_true", help="also time POST /api/predict in-process")
+    parser.add_argument("--save", metavar="PATH", help="write results as a baseline JSON file")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p50 slowdown before failing (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    data = generate_recording(args.samples, parse_mix(args.mix), args.seed)
+    results = run_benchmarks(data, args.format, args.repeat, args.model, args.endpoint)
+
+    print("=" * 78)
+    print(f"HAR Benchmark: {args.samples} samples, mix={args.mix}, format={args.format}, repeat={args.repeat}")
+    print("=" * 78)
+    print(f"{'stage':<36}{'p50 ms':>10}{'p99 ms':>10}{'windows/s':>14}")
+    for name, r in results.items():
+        print(f"{name:<36}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['windows_per_s']:>14.0f}")
+
+    report = {
+        "config": {**{k: getattr(args, k) for k in ("samples", "mix", "format", "repeat", "seed")},
+                   "dtype": FEATURE_DTYPE.name},
+        "environment": {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine()},
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Saved baseline: {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            print(f"! Baseline config differs: {baseline.get('config')}")
+        print()
+        print(f"{'stage':<36}{'base ms':>10}{'now ms':>10}{'ratio':>8}")
+        rows = compare(results, baseline, args.tolerance)
+        for name, old, cur, ratio, regressed in rows:
+            print(f"{name:<36}{old:>10.2f}{cur:>10.2f}{ratio:>8.2f}{'  REGRESSION' if regressed else ''}")
+        if any(r[4] for r in rows):
+            print(f"✗ p50 regressed by more than {args.tolerance:.0%}")
+            return 1
+        print("✓ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
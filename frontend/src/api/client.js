@@ -17,11 +17,14 @@ export const api = {
   },
 
   // Predict activity from uploaded file
-  predictActivity: async (file) => {
+  // (overview adds the whole-recording envelope; the server then keeps the recording for zooming)
+  predictActivity: async (file, { overview = false } = {}) => {
     const formData = new FormData();
     formData.append('file', file);
 
+    // Only the sections the results page draws; per-window labels are skipped
     const response = await apiClient.post('/api/predict', formData, {
+      params: { include: overview ? 'signals,fft,overview' : 'signals,fft' },
       headers: {
         'Content-Type': 'multipart/form-data',
       },
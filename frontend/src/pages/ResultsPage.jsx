@@ -32,8 +32,20 @@ const ResultsPage = () => {
     return null;
   }
 
-  // Prepare data for time-domain chart
+  // Prepare data for time-domain chart: the whole-recording min/max envelope
+  // when the overview was returned, otherwise the first samples
   const prepareTimeData = () => {
+    if (result.overview) {
+      const { t, min, max } = result.overview.signals;
+      return t.map((time, index) => {
+        const point = { time: time.toFixed(2) };
+        Object.keys(min).forEach((key) => {
+          point[`${key}_min`] = min[key][index];
+          point[`${key}_max`] = max[key][index];
+        });
+        return point;
+      });
+    }
     if (!result.signals_preview) return [];
     
     const { t, acc_x, acc_y, acc_z, gyro_x, gyro_y, gyro_z } = result.signals_preview;
@@ -426,14 +438,28 @@ const ResultsPage = () => {
                         }}
                       />
                       <Legend wrapperStyle={{ color: '#9ca3af' }} />
-                      <Line 
-                        type="monotone" 
-                        dataKey={getCurrentSignalKey()} 
-                        stroke="#06b6d4" 
-                        strokeWidth={2}
-                        dot={false}
-                        name={`${selectedSignal.toUpperCase()} ${selectedAxis.toUpperCase()}`}
-                      />
+                      {result.overview ? (
+                        [['max', '#06b6d4'], ['min', '#3b82f6']].map(([bound, color]) => (
+                          <Line
+                            key={bound}
+                            type="monotone"
+                            dataKey={`${getCurrentSignalKey()}_${bound}`}
+                            stroke={color}
+                            strokeWidth={1.5}
+                            dot={false}
+                            name={`${selectedSignal.toUpperCase()} ${selectedAxis.toUpperCase()} ${bound}`}
+                          />
+                        ))
+                      ) : (
+                        <Line 
+                          type="monotone" 
+                          dataKey={getCurrentSignalKey()} 
+                          stroke="#06b6d4" 
+                          strokeWidth={2}
+                          dot={false}
+                          name={`${selectedSignal.toUpperCase()} ${selectedAxis.toUpperCase()}`}
+                        />
+                      )}
                     </LineChart>
                   </ResponsiveContainer>
                 </motion.div>
@@ -14,8 +14,9 @@ const UploadPage = () => {
   const [selectedFile, setSelectedFile] = useState(null);
   const [isLoading, setIsLoading] = useState(false);
   const [filePreview, setFilePreview] = useState(null);
+  const [wholeRecording, setWholeRecording] = useState(false);
 
-  const allowedTypes = ['.csv', '.txt', '.xlsx'];
+  const allowedTypes = ['.csv', '.txt', '.xlsx', '.npy', '.har'];
 
   const parseFilePreview = async (file) => {
     return new Promise((resolve) => {
@@ -54,20 +55,13 @@ const UploadPage = () => {
 
   const onDrop = async (acceptedFiles, rejectedFiles) => {
     if (rejectedFiles.length > 0) {
-      toast.error('Invalid file type. Please upload CSV, TXT, or XLSX files.');
+      toast.error('Invalid file type. Please upload CSV, TXT, XLSX, NPY or HAR files.');
       return;
     }
 
     if (acceptedFiles.length > 0) {
       const file = acceptedFiles[0];
       
-      // Check file size (10MB limit)
-      const maxSize = 10 * 1024 * 1024;
-      if (file.size > maxSize) {
-        toast.error('File too large. Maximum size is 10MB.');
-        return;
-      }
-
       setSelectedFile(file);
       toast.success(`File "${file.name}" selected successfully!`);
       
@@ -85,6 +79,8 @@ const UploadPage = () => {
       'text/csv': ['.csv'],
       'text/plain': ['.txt'],
       'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': ['.xlsx'],
+      // binary uploads: NumPy arrays and the raw float32 .har format
+      'application/octet-stream': ['.npy', '.har'],
     },
     multiple: false,
   });
@@ -98,7 +94,7 @@ const UploadPage = () => {
     setIsLoading(true);
 
     try {
-      const result = await api.predictActivity(selectedFile);
+      const result = await api.predictActivity(selectedFile, { overview: wholeRecording });
       
       toast.success('Analysis completed successfully!');
       
@@ -261,7 +257,7 @@ const UploadPage = () => {
                   
                   <div className="flex items-center space-x-3 px-5 py-3 bg-gray-800/80 rounded-full border border-gray-700">
                     <FileText className="h-5 w-5 text-gray-400" />
-                    <span className="text-sm font-medium text-gray-300">Supported: CSV, TXT, XLSX</span>
+                    <span className="text-sm font-medium text-gray-300">Supported: CSV, TXT, XLSX, NPY, HAR</span>
                   </div>
                 </div>
               </div>
@@ -327,6 +323,17 @@ const UploadPage = () => {
                       </div>
                     </motion.div>
                   )}
+
+                  {/* Whole-recording plot instead of the first samples */}
+                  <label className="flex items-center space-x-3 pt-4 mt-4 border-t border-green-500/30 cursor-pointer">
+                    <input
+                      type="checkbox"
+                      checked={wholeRecording}
+                      onChange={(e) => setWholeRecording(e.target.checked)}
+                      className="h-4 w-4 accent-green-500"
+                    />
+                    <span className="text-sm text-green-200">Plot the whole recording (slower for large files)</span>
+                  </label>
                 </motion.div>
               )}
 
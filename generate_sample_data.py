@@ -84,8 +84,14 @@ def save_sample_data(filename, activity='walking', n_samples=256):
         df.to_csv(filename, index=False, header=False, sep=' ')
     elif filename.endswith('.xlsx'):
         df.to_excel(filename, index=False, header=False)
+    elif filename.endswith('.npy'):
+        np.save(filename, df.to_numpy(dtype=np.float32))
+    elif filename.endswith('.har'):
+        from har_io import encode_har_binary
+        with open(filename, 'wb') as f:
+            f.write(encode_har_binary(df.to_numpy()))
     else:
-        raise ValueError("Filename must end with .csv, .txt, or .xlsx")
+        raise ValueError("Filename must end with .csv, .txt, .xlsx, .npy, or .har")
     
     print(f"✓ Generated {activity} data: {filename}")
     print(f"  Samples: {n_samples}")
@@ -103,6 +109,7 @@ if __name__ == "__main__":
     save_sample_data('sample_standing.csv', 'standing', 300)
     save_sample_data('sample_walking.txt', 'walking', 300)
     save_sample_data('sample_walking.xlsx', 'walking', 300)
+    save_sample_data('sample_walking.har', 'walking', 300)
     
     print()
     print("=" * 50)
@@ -0,0 +1,183 @@
+"""
+Bulk prediction: many recordings (plain files, zip or tar archives) classified
+with a single vectorized inference call.
+
+    python har_bulk.py recordings/ --output results.json
+"""
+
+import io
+import os
+import posixpath
+import tarfile
+import zipfile
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from har_io import SUPPORTED_EXTENSIONS, parse_file_content
+from har_utils import FEATURE_DTYPE, WIN_S
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz')
+BULK_WORKERS = int(os.environ.get("HAR_BULK_WORKERS", str(os.cpu_count() or 1)))
+BULK_MAX_FILES = int(os.environ.get("HAR_BULK_MAX_FILES", "1000"))
+BULK_MAX_BYTES = int(os.environ.get("HAR_BULK_MAX_BYTES", str(1 << 30)))   # uncompressed total
+
+
+def is_archive(filename):
+    return filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def is_recording(filename):
+    base = posixpath.basename(filename)
+    return filename.lower().endswith(SUPPORTED_EXTENSIONS) and not base.startswith(('.', '__MACOSX'))
+
+
+def subject_of(name):
+    """Directory a recording sits in ('subject01/walk.csv' -> 'subject01'), or None"""
+    parent = posixpath.dirname(name.replace('\\', '/'))
+    return posixpath.basename(parent) or None
+
+
+def expand_upload(contents, filename):
+    """[(name, bytes)] of the recordings in an upload: the file itself, or an archive's members"""
+    if not is_archive(filename):
+        return [(filename, contents)]
+    members = []
+    if filename.lower().endswith('.zip'):
+        with zipfile.ZipFile(io.BytesIO(contents)) as zf:
+            infos = [i for i in zf.infolist() if not i.is_dir() and is_recording(i.filename)]
+            _check_limits(len(infos), sum(i.file_size for i in infos))
+            members = [(i.filename, zf.read(i)) for i in infos]
+    else:
+        with tarfile.open(fileobj=io.BytesIO(contents), mode='r:*') as tf:
+            infos = [i for i in tf.getmembers() if i.isfile() and is_recording(i.name)]
+            _check_limits(len(infos), sum(i.size for i in infos))
+            members = [(i.name, tf.extractfile(i).read()) for i in infos]
+    return [(posixpath.join(filename, name), data) for name, data in members]
+
+
+def _check_limits(n_files, n_bytes):
+    if n_files > BULK_MAX_FILES:
+        raise ValueError(f"Too many recordings ({n_files}); limit is {BULK_MAX_FILES}")
+    if n_bytes > BULK_MAX_BYTES:
+        raise ValueError(f"Recordings total {n_bytes} bytes uncompressed; limit is {BULK_MAX_BYTES}")
+
+
+def featurize_file(name, contents, featurize, window=WIN_S):
+    """{'name', 'samples', 'features'} for one recording, or {'name', 'error'}"""
+    try:
+        data = parse_file_content(contents, name)
+        if data.shape[1] < 6:
+            raise ValueError(f"Expected at least 6 columns, got {data.shape[1]}")
+        if len(data) < window:
+            raise ValueError(f"Insufficient data. Need at least {window} samples.")
+        return {"name": name, "samples": len(data), "features": featurize(np.asarray(data[:, :6], dtype=FEATURE_DTYPE))}
+    except Exception as e:
+        return {"name": name, "error": str(e)}
+
+
+def predict_bulk(files, predictor, featurize, workers=BULK_WORKERS):
+    """Per-file results and per-subject summaries for [(name, bytes)] recordings.
+
+    Files are parsed and featurized concurrently; the window features of all of
+    them are stacked into one matrix and classified in a single call.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        parsed = list(pool.map(lambda f: featurize_file(f[0], f[1], featurize), files))
+
+    ok = [p for p in parsed if "features" in p]
+    labels, proba = np.array([]), None
+    if ok:
+        X = np.nan_to_num(np.concatenate([p["features"] for p in ok]), nan=0.0)
+        labels, proba = predictor.predict_and_proba(X)
+    mapping = predictor.activity_mapping or {}
+    names = [mapping.get(label, f"Unknown_{label}") for label in labels]
+
+    results, by_subject = [], defaultdict(Counter)
+    start = 0
+    for p in parsed:
+        subject = subject_of(p["name"])
+        if "error" in p:
+            results.append({"filename": p["name"], "subject": subject, "error": p["error"]})
+            continue
+        stop = start + len(p["features"])
+        file_names = names[start:stop]
+        counts = Counter(file_names)
+        if subject is not None:
+            by_subject[subject].update(counts)
+        probabilities, confidence = None, 0.0
+        if proba is not None:
+            avg = proba[start:stop].mean(axis=0)
+            confidence = float(avg.max())
+            probabilities = {mapping.get(c, f"Activity_{c}"): float(v) for c, v in zip(predictor.classes_, avg)}
+        results.append({
+            "filename": p["name"],
+            "subject": subject,
+            "activity": counts.most_common(1)[0][0],
+            "confidence": confidence,
+            "probabilities": probabilities,
+            "samples": int(p["samples"]),
+            "windows_analyzed": stop - start,
+            "prediction_distribution": dict(counts),
+            "all_predictions": file_names,
+        })
+        start = stop
+
+    subjects = {
+        subject: {"activity": counts.most_common(1)[0][0], "windows": sum(counts.values()),
+                       "prediction_distribution": dict(counts)}
+        for subject, counts in by_subject.items()
+    }
+    meta = {"files": len(results), "failed": len(parsed) - len(ok), "windows_analyzed": len(names)}
+    return {"files": results, "subjects": subjects, "meta": meta}
+
+
+def collect_directory(root):
+    """[(relative name, bytes)] of every recording under root, expanding archives"""
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for fname in sorted(filenames):
+            path = os.path.join(dirpath, fname)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            if is_archive(fname) or is_recording(name):
+                with open(path, 'rb') as f:
+                    files.extend(expand_upload(f.read(), name))
+    return files
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import time
+
+    from har_model import load_predictor
+    from har_utils import process_sliding_windows
+
+    parser = argparse.ArgumentParser(description="Classify every recording under a directory")
+    parser.add_argument("directory")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--workers", type=int, default=BULK_WORKERS)
+    parser.add_argument("--artifact", default="har_model_artifact")
+    parser.add_argument("--model", default="har_predictor_complete.pkl")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    predictor = load_predictor(args.artifact, args.model)
+    files = collect_directory(args.directory)
+    result = predict_bulk(files, predictor,
+                          lambda data: process_sliding_windows(data[:, :3], data[:, 3:6], WIN_S, WIN_S // 2,
+                                                               columns=predictor.feature_columns),
+                          args.workers)
+    elapsed = time.perf_counter() - start
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f)
+        for r in result["files"]:
+            print(f"{r['filename']:<50} {r.get('activity') or 'ERROR: ' + r['error']}")
+        print(f"✓ {result['meta']['files']} files, {result['meta']['windows_analyzed']} windows "
+              f"in {elapsed:.2f}s -> {args.output}")
+    else:
+        print(json.dumps(result, indent=2))
@@ -0,0 +1,139 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from har_metrics import metrics
+
+# HAR_RESULT_CACHE=0 disables caching; the disk tier is off unless a directory is given
+RESULT_CACHE_ENABLED = os.environ.get("HAR_RESULT_CACHE", "1") != "0"
+RESULT_CACHE_MEMORY_MB = float(os.environ.get("HAR_RESULT_CACHE_MEMORY_MB", "64"))
+RESULT_CACHE_DIR = os.environ.get("HAR_RESULT_CACHE_DIR") or None
+RESULT_CACHE_DISK_MB = float(os.environ.get("HAR_RESULT_CACHE_DISK_MB", "512"))
+
+DIGEST_BLOCK = 1 << 20
+
+
+def file_digest(fileobj, block=DIGEST_BLOCK):
+    """sha256 hex digest of a seekable binary file, read in blocks; leaves it rewound"""
+    h = hashlib.sha256()
+    fileobj.seek(0)
+    for data in iter(lambda: fileobj.read(block), b""):
+        h.update(data)
+    fileobj.seek(0)
+    return h.hexdigest()
+
+
+class ResultCache:
+    """Serialized responses keyed by upload content, with an optional disk tier.
+
+    The memory tier is an LRU bounded by total bytes. The disk tier keeps one
+    file per key in `disk_dir`, evicting least recently used files (by mtime,
+    refreshed on every hit) once they exceed `disk_max_bytes`; several workers
+    may share the directory.
+    """
+
+    def __init__(self, memory_bytes, disk_dir=None, disk_max_bytes=0, enabled=True):
+        self.enabled = enabled
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        if enabled and disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def key(digest, *parts):
+        """Cache key for an upload digest plus anything else the response depends on"""
+        return hashlib.sha256(":".join([digest, *map(str, parts)]).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _remember(self, key, body):
+        if len(body) > self.memory_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_used -= len(old)
+            self._memory[key] = body
+            self._memory_used += len(body)
+            while self._memory_used > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_used -= len(evicted)
+
+    def get(self, key):
+        """Stored response body, or None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            body = self._memory.get(key)
+            if body is not None:
+                self._memory.move_to_end(key)
+        if body is not None:
+            metrics.inc("har_result_cache_total", tier="memory", outcome="hit")
+            return body
+        if self.disk_dir:
+            try:
+                with open(self._path(key), "rb") as f:
+                    body = f.read()
+                os.utime(self._path(key))
+            except OSError:
+                body = None
+            if body is not None:
+                metrics.inc("har_result_cache_total", tier="disk", outcome="hit")
+                self._remember(key, body)
+                return body
+        metrics.inc("har_result_cache_total", tier="all", outcome="miss")
+        return None
+
+    def put(self, key, body):
+        if not self.enabled:
+            return
+        self._remember(key, body)
+        if self.disk_dir and len(body) <= self.disk_max_bytes:
+            fd, tmp = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(body)
+            os.replace(tmp, self._path(key))
+            self._evict_disk()
+
+    def _evict_disk(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith(".json"):
+                try:
+                    st = os.stat(os.path.join(self.disk_dir, name))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, name))
+        used = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if used <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.disk_dir, name))
+                used -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_used = 0
+
+
+_result_cache = None
+
+
+def get_result_cache():
+    """Process-wide cache configured from the HAR_RESULT_CACHE* environment variables"""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache(int(RESULT_CACHE_MEMORY_MB * 2**20), RESULT_CACHE_DIR,
+                                    int(RESULT_CACHE_DISK_MB * 2**20), RESULT_CACHE_ENABLED)
+    return _result_cache
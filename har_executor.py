@@ -0,0 +1,129 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from har_utils import FEATURE_DTYPE, N_FEATURES, process_windows_batch, process_sliding_windows, window_count
+
+# HAR_FEATURE_WORKERS=0 keeps extraction in the calling process
+FEATURE_WORKERS = int(os.environ.get("HAR_FEATURE_WORKERS", "0"))
+FEATURE_CHUNK = int(os.environ.get("HAR_FEATURE_CHUNK", "256"))  # windows per task
+
+
+def _share(arr):
+    """Copy an array into a new shared memory block; return (block, spec) where spec attaches to it."""
+    arr = np.ascontiguousarray(arr, dtype=FEATURE_DTYPE)
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+
+def _attach(spec):
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _windows_task(src_spec, dst_spec, start, stop, columns):
+    src_shm, src = _attach(src_spec)
+    dst_shm, dst = _attach(dst_spec)
+    try:
+        dst[start:stop] = process_windows_batch(src[start:stop, :, :3], src[start:stop, :, 3:6], columns=columns)
+    finally:
+        del src, dst
+        src_shm.close()
+        dst_shm.close()
+
+
+def _sliding_task(src_spec, dst_spec, start, stop, window, hop, columns):
+    src_shm, src = _attach(src_spec)
+    dst_shm, dst = _attach(dst_spec)
+    seg = None
+    try:
+        seg = src[start * hop:(stop - 1) * hop + window]
+        dst[start:stop] = process_sliding_windows(seg[:, :3], seg[:, 3:6], window, hop, columns=columns)
+    finally:
+        del src, dst, seg
+        src_shm.close()
+        dst_shm.close()
+
+
+class FeatureExecutor:
+    """Runs feature extraction in-process or fanned out over a process pool.
+
+    Inputs are copied once into shared memory and workers write their chunk
+    of the feature matrix straight into a shared output block, so only
+    (name, shape, range) tuples cross the process boundary.
+    """
+
+    def __init__(self, workers=FEATURE_WORKERS, chunk_windows=FEATURE_CHUNK):
+        self.workers = workers
+        self.chunk_windows = chunk_windows
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def _chunks(self, n_windows):
+        return [(s, min(s + self.chunk_windows, n_windows)) for s in range(0, n_windows, self.chunk_windows)]
+
+    def _use_pool(self, n_windows):
+        return self.workers > 0 and n_windows > self.chunk_windows
+
+    def _run(self, task, data, n_windows, n_features, *args):
+        src_shm, src_spec = _share(data)
+        dst_shm = shared_memory.SharedMemory(create=True, size=max(n_windows * n_features * 8, 1))
+        dst_spec = (dst_shm.name, (n_windows, n_features), np.dtype(float).str)
+        try:
+            pool = self._get_pool()
+            futures = [pool.submit(task, src_spec, dst_spec, s, e, *args) for s, e in self._chunks(n_windows)]
+            for f in futures:
+                f.result()
+            return np.ndarray((n_windows, n_features), dtype=float, buffer=dst_shm.buf).copy()
+        finally:
+            src_shm.close()
+            src_shm.unlink()
+            dst_shm.close()
+            dst_shm.unlink()
+
+    def windows_features(self, total_acc_windows, gyro_windows, columns=None):
+        """Feature matrix for (n_windows, 128, 3) acc/gyro stacks (see process_windows_batch)"""
+        n_windows = len(total_acc_windows)
+        if not self._use_pool(n_windows):
+            return process_windows_batch(total_acc_windows, gyro_windows, columns=columns)
+        data = np.concatenate([np.asarray(total_acc_windows, dtype=FEATURE_DTYPE),
+                               np.asarray(gyro_windows, dtype=FEATURE_DTYPE)], axis=2)
+        n_features = N_FEATURES if columns is None else len(columns)
+        return self._run(_windows_task, data, n_windows, n_features, columns)
+
+    def sliding_features(self, sensor_data, window=128, hop=64, columns=None):
+        """Feature matrix of every window of a continuous (n_samples, 6) recording (see process_sliding_windows)"""
+        sensor_data = np.asarray(sensor_data)
+        n_windows = window_count(len(sensor_data), window, hop)
+        if not self._use_pool(n_windows):
+            return process_sliding_windows(sensor_data[:, :3], sensor_data[:, 3:6], window, hop, columns=columns)
+        n_features = N_FEATURES if columns is None else len(columns)
+        return self._run(_sliding_task, sensor_data[:, :6], n_windows, n_features, window, hop, columns)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+
+_default_executor = None
+
+
+def get_default_executor():
+    """Process-wide executor configured from HAR_FEATURE_WORKERS / HAR_FEATURE_CHUNK"""
+    global _default_executor
+    if _default_executor is None:
+        _default_executor = FeatureExecutor()
+    return _default_executor
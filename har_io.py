@@ -0,0 +1,234 @@
+import os
+import struct
+from io import BytesIO
+
+import numpy as np
+
+from har_utils import FEATURE_DTYPE, FS
+
+# Raw binary recording: 12-byte header (magic, channels, sampling rate in Hz,
+# all little-endian) followed by row-major little-endian float32 samples.
+HAR_MAGIC = b'HAR1'
+HAR_HEADER = struct.Struct('<4sII')
+NPY_MAGIC = b'\x93NUMPY'
+ZIP_MAGIC = b'PK\x03\x04'   # .xlsx containers
+
+TEXT_EXTENSIONS = ('.csv', '.txt')
+BINARY_EXTENSIONS = ('.npy', '.har')
+SUPPORTED_EXTENSIONS = TEXT_EXTENSIONS + ('.xlsx',) + BINARY_EXTENSIONS
+
+SNIFF_BYTES = 4096
+CHUNK_ROWS = int(os.environ.get("HAR_UPLOAD_CHUNK_ROWS", "65536"))  # rows parsed per step
+
+
+def encode_har_binary(samples, fs=FS):
+    """Serialize an (n_samples, channels) array in the raw .har binary format"""
+    samples = np.ascontiguousarray(samples, dtype='<f4')
+    if samples.ndim != 2:
+        raise ValueError("Samples must be a 2-D (n_samples, channels) array")
+    return HAR_HEADER.pack(HAR_MAGIC, samples.shape[1], int(fs)) + samples.tobytes()
+
+
+def _har_channels(header, payload_size, fs=FS):
+    """Validate a .har header against its payload size; return the channel count"""
+    if len(header) < HAR_HEADER.size:
+        raise ValueError("Binary file is shorter than its header")
+    magic, channels, rate = HAR_HEADER.unpack_from(header)
+    if magic != HAR_MAGIC:
+        raise ValueError("Not a HAR binary file (bad magic)")
+    if channels == 0 or payload_size % (4 * channels):
+        raise ValueError(f"Binary payload does not hold whole {channels}-channel float32 samples")
+    if rate != fs:
+        raise ValueError(f"Recording sampled at {rate} Hz, model expects {fs} Hz")
+    return channels
+
+
+def read_har_binary(contents, fs=FS):
+    """View a .har payload as an (n_samples, channels) float32 array without copying"""
+    channels = _har_channels(contents, len(contents) - HAR_HEADER.size, fs)
+    return np.frombuffer(contents, dtype='<f4', offset=HAR_HEADER.size).reshape(-1, channels)
+
+
+def _npy_header(fileobj):
+    """Read a .npy header; return (shape, fortran_order, dtype) of a 2-D numeric array"""
+    version = np.lib.format.read_magic(fileobj)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(fileobj)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(fileobj)
+    if dtype.hasobject or dtype.kind not in 'iuf':
+        raise ValueError(f"Unsupported .npy dtype {dtype}")
+    if len(shape) != 2:
+        raise ValueError(f"Expected a 2-D (n_samples, channels) array, got shape {shape}")
+    return shape, fortran_order, dtype
+
+
+def read_npy(contents):
+    """View a .npy payload as a 2-D numeric array without copying"""
+    buf = BytesIO(contents)
+    shape, fortran_order, dtype = _npy_header(buf)
+    data = np.frombuffer(contents, dtype=dtype, count=int(np.prod(shape)), offset=buf.tell())
+    return data.reshape(shape[::-1]).T if fortran_order else data.reshape(shape)
+
+
+def sniff_text_format(contents):
+    """Guess (separator, header row) of a delimited text file from its first line"""
+    head = contents[:SNIFF_BYTES].decode('utf-8', errors='replace').lstrip('\ufeff')
+    first = next((line for line in head.splitlines() if line.strip()), '')
+    if ',' in first:
+        sep = ','
+    elif ';' in first:
+        sep = ';'
+    elif '\t' in first:
+        sep = '\t'
+    else:
+        sep = r'\s+'
+    tokens = first.split() if sep == r'\s+' else first.split(sep)
+    try:
+        [float(t) for t in tokens if t.strip()]
+        header = None
+    except ValueError:
+        header = 0
+    return sep, header
+
+
+def detect_format(contents, filename):
+    """'npy', 'har', 'xlsx' or 'text', by magic bytes first and extension second"""
+    if contents.startswith(NPY_MAGIC):
+        return 'npy'
+    if contents.startswith(HAR_MAGIC):
+        return 'har'
+    if contents.startswith(ZIP_MAGIC) or filename.lower().endswith('.xlsx'):
+        return 'xlsx'
+    return 'text'
+
+
+def parse_file_content(contents: bytes, filename: str):
+    """Parse an uploaded recording into an (n_samples, channels) numeric array"""
+    try:
+        fmt = detect_format(contents, filename)
+        if fmt == 'npy':
+            return read_npy(contents)
+        if fmt == 'har':
+            return read_har_binary(contents)
+        import pandas as pd   # deferred: binary uploads never need it
+        if fmt == 'xlsx':
+            df = pd.read_excel(BytesIO(contents), header=None)
+        else:
+            sep, header = sniff_text_format(contents)
+            df = pd.read_csv(BytesIO(contents), sep=sep, header=header)
+        return df.to_numpy(dtype=FEATURE_DTYPE)
+    except Exception as e:
+        raise ValueError(f"File parsing error: {str(e)}")
+
+
+def _read_rows(fileobj, offset, dtype, shape, fortran_order, chunk_rows):
+    """Yield row blocks of an on-disk (n, channels) array, reading one block at a time"""
+    n, channels = shape
+    itemsize = dtype.itemsize
+    for start in range(0, n, chunk_rows):
+        stop = min(start + chunk_rows, n)
+        if fortran_order:
+            cols = []
+            for j in range(channels):
+                fileobj.seek(offset + (j * n + start) * itemsize)
+                cols.append(np.frombuffer(fileobj.read((stop - start) * itemsize), dtype=dtype))
+            yield np.column_stack(cols)
+        else:
+            fileobj.seek(offset + start * channels * itemsize)
+            raw = fileobj.read((stop - start) * channels * itemsize)
+            yield np.frombuffer(raw, dtype=dtype).reshape(-1, channels)
+
+
+def _npy_chunks(fileobj, chunk_rows):
+    shape, fortran_order, dtype = _npy_header(fileobj)
+    return _read_rows(fileobj, fileobj.tell(), dtype, shape, fortran_order, chunk_rows)
+
+
+def _har_chunks(fileobj, chunk_rows):
+    header = fileobj.read(HAR_HEADER.size)
+    size = fileobj.seek(0, 2) - HAR_HEADER.size
+    channels = _har_channels(header, size)
+    return _read_rows(fileobj, HAR_HEADER.size, np.dtype('<f4'), (size // (4 * channels), channels), False, chunk_rows)
+
+
+def _xlsx_chunks(fileobj, chunk_rows):
+    import openpyxl
+    wb = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = []
+        for row in wb.worksheets[0].iter_rows(values_only=True):
+            rows.append(row)
+            if len(rows) == chunk_rows:
+                yield np.array(rows, dtype=FEATURE_DTYPE)
+                rows = []
+        if rows:
+            yield np.array(rows, dtype=FEATURE_DTYPE)
+    finally:
+        wb.close()
+
+
+def _text_chunks(fileobj, chunk_rows):
+    import pandas as pd
+    sep, header = sniff_text_format(fileobj.read(SNIFF_BYTES))
+    fileobj.seek(0)
+    with pd.read_csv(fileobj, sep=sep, header=header, chunksize=chunk_rows) as reader:
+        for df in reader:
+            yield df.to_numpy(dtype=FEATURE_DTYPE)
+
+
+def iter_file_chunks(fileobj, filename, chunk_rows=CHUNK_ROWS):
+    """Parse a seekable binary file object into successive (rows, channels) arrays.
+
+    Only one block of at most chunk_rows rows is held at a time, so memory stays
+    bounded by the chunk size rather than the file size.
+    """
+    try:
+        fileobj.seek(0)
+        fmt = detect_format(fileobj.read(SNIFF_BYTES), filename)
+        fileobj.seek(0)
+        if fmt == 'npy':
+            chunks = _npy_chunks(fileobj, chunk_rows)
+        elif fmt == 'har':
+            chunks = _har_chunks(fileobj, chunk_rows)
+        elif fmt == 'xlsx':
+            chunks = _xlsx_chunks(fileobj, chunk_rows)
+        else:
+            chunks = _text_chunks(fileobj, chunk_rows)
+        yield from chunks
+    except Exception as e:
+        raise ValueError(f"File parsing error: {str(e)}")
+
+
+def count_samples(fileobj, filename, block=1 << 20):
+    """Number of sample rows in a seekable file, from headers where possible.
+
+    Text files are counted by newlines (minus a sniffed header row), so blank
+    lines make this an upper bound; used for progress reporting only.
+    """
+    fileobj.seek(0)
+    head = fileobj.read(SNIFF_BYTES)
+    fmt = detect_format(head, filename)
+    fileobj.seek(0)
+    try:
+        if fmt == 'npy':
+            return _npy_header(fileobj)[0][0]
+        if fmt == 'har':
+            size = fileobj.seek(0, 2) - HAR_HEADER.size
+            return size // (4 * _har_channels(head, size))
+        if fmt == 'xlsx':
+            import openpyxl
+            wb = openpyxl.load_workbook(fileobj, read_only=True)
+            try:
+                return wb.worksheets[0].max_row or 0
+            finally:
+                wb.close()
+        lines, last = 0, b''
+        for data in iter(lambda: fileobj.read(block), b''):
+            lines += data.count(b'\n')
+            last = data
+        if last and not last.endswith(b'\n'):
+            lines += 1
+        return lines - (sniff_text_format(head)[1] == 0)
+    finally:
+        fileobj.seek(0)
@@ -0,0 +1,171 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = int(os.environ.get("HAR_JOB_WORKERS", "2"))
+JOB_RETENTION = int(os.environ.get("HAR_JOB_RETENTION", "100"))   # finished jobs kept for polling
+JOB_DIR = os.environ.get("HAR_JOB_DIR") or None                   # spool directory for uploads
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """One recording being analysed in the background.
+
+    `labels` grows as window batches are classified, so pollers can read
+    partial predictions; `result` is set once the job is done.
+    """
+
+    def __init__(self, filename, path, options=None):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.path = path
+        self.options = options or {}
+        self.status = QUEUED
+        self.windows_done = 0
+        self.windows_total = None
+        self.labels = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.cancel_event = threading.Event()
+
+    def progress(self, labels):
+        """Record classified windows; raises JobCancelled once cancellation was requested"""
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+        self.labels = labels
+        self.windows_done = len(labels)
+        self.updated_at = time.time()
+
+    def summary(self, offset=None):
+        """Status dict; with offset, also the predictions from that window on"""
+        info = {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "windows_done": self.windows_done,
+            "windows_total": self.windows_total,
+            "progress": (min(self.windows_done / self.windows_total, 1.0) if self.windows_total else
+                         (1.0 if self.status == DONE else None)),
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+        if offset is not None:
+            info["offset"] = offset
+            info["predictions"] = self.labels[offset:self.windows_done]
+        return info
+
+
+class JobManager:
+    """Runs analysis jobs on a local thread pool.
+
+    Uploads are copied to a spool file because the request's upload is closed
+    when the request ends. `run(job, fileobj)` does the work and returns the
+    result; it reports progress through job.progress, which is also where a
+    cancelled job stops. Only the newest `retention` finished jobs are kept.
+    """
+
+    def __init__(self, run, workers=JOB_WORKERS, retention=JOB_RETENTION, spool_dir=JOB_DIR):
+        self.run = run
+        self.workers = workers
+        self.retention = retention
+        self.spool_dir = spool_dir
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="har-job")
+            return self._pool
+
+    def submit(self, fileobj, filename, count_windows=None, options=None):
+        """Spool fileobj and queue a job for it; count_windows(fileobj, filename) sets windows_total.
+
+        options are kept on the job for `run` (e.g. which response sections to build).
+        """
+        fd, path = tempfile.mkstemp(prefix="har-job-", dir=self.spool_dir)
+        with os.fdopen(fd, "wb") as out:
+            fileobj.seek(0)
+            shutil.copyfileobj(fileobj, out)
+        job = Job(filename, path, options)
+        if count_windows is not None:
+            try:
+                with open(path, "rb") as f:
+                    job.windows_total = count_windows(f, filename)
+            except Exception:
+                job.windows_total = None
+        with self._lock:
+            self._jobs[job.id] = job
+        self._prune()
+        self._get_pool().submit(self._execute, job)
+        return job
+
+    def _execute(self, job):
+        if job.cancel_event.is_set():
+            self._finish(job, CANCELLED)
+            return
+        job.status = RUNNING
+        job.updated_at = time.time()
+        try:
+            with open(job.path, "rb") as f:
+                job.result = self.run(job, f)
+            self._finish(job, DONE)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            job.error = str(getattr(e, "detail", e))
+            self._finish(job, FAILED)
+
+    def _finish(self, job, status):
+        job.status = status
+        job.updated_at = time.time()
+        try:
+            os.remove(job.path)
+        except OSError:
+            pass
+
+    def _prune(self):
+        with self._lock:
+            finished = [j for j in self._jobs.values() if j.status in FINISHED]
+            for job in finished[:max(0, len(finished) - self.retention)]:
+                del self._jobs[job.id]
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Request cancellation; queued jobs never start, running ones stop at the next batch"""
+        job = self._jobs.get(job_id)
+        if job is not None and job.status not in FINISHED:
+            job.cancel_event.set()
+        return job
+
+    def remove(self, job_id):
+        with self._lock:
+            return self._jobs.pop(job_id, None)
+
+    def shutdown(self):
+        for job in list(self._jobs.values()):
+            job.cancel_event.set()
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+        for job in list(self._jobs.values()):
+            if job.status == QUEUED:
+                self._finish(job, CANCELLED)
@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+# HAR_METRICS=0 turns every call below into a no-op
+METRICS_ENABLED = os.environ.get("HAR_METRICS", "1") != "0"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_DISABLED = nullcontext()
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Metrics:
+    """Thread-safe counters, gauges and latency histograms rendered in Prometheus text format.
+
+    Series are created on first use and keyed by (name, labels); histograms keep
+    per-bucket counts plus sum and count, as Prometheus expects.
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED, buckets=LATENCY_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._help = {}
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            h[0][i] += 1
+            h[1] += value
+            h[2] += 1
+
+    def stage(self, name):
+        """Context manager timing one pipeline stage into har_stage_seconds{stage=name}.
+
+        Exceptions escaping the block are counted in har_stage_errors_total.
+        """
+        if not self.enabled:
+            return _DISABLED
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc("har_stage_errors_total", stage=name)
+            raise
+        finally:
+            self.observe("har_stage_seconds", time.perf_counter() - t0, stage=name)
+
+    def render(self):
+        """Prometheus text exposition (version 0.0.4) of every series"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted((k, (list(h[0]), h[1], h[2])) for k, h in self._histograms.items())
+        lines = []
+        seen = set()
+
+        def header(name, kind):
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, key), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_format_labels(key)} {value}")
+        for (name, key), value in gauges:
+            header(name, "gauge")
+            lines.append(f"{name}{_format_labels(key)} {value}")
+        for (name, key), (counts, total, count) in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, c in zip(self.buckets + ("+Inf",), counts):
+                cumulative += c
+                lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{name}_count{_format_labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+metrics.describe("har_requests_total", "HTTP requests by route and status code")
+metrics.describe("har_request_seconds", "HTTP request latency by route")
+metrics.describe("har_stage_seconds", "Latency of each pipeline stage")
+metrics.describe("har_stage_errors_total", "Exceptions raised inside each pipeline stage")
+metrics.describe("har_windows_processed_total", "Windows featurized and classified")
+metrics.describe("har_bytes_ingested_total", "Sensor payload bytes received")
+metrics.describe("har_inference_batches_total", "Inference batches run by the scheduler")
+metrics.describe("har_inference_queue_windows", "Windows waiting for inference")
+metrics.describe("har_inflight_requests", "Admitted analysis requests and stream batches in progress")
+metrics.describe("har_open_streams", "Open WebSocket streams")
+metrics.describe("har_rejected_total", "Requests refused by admission control, by reason")
@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+
+from har_utils import FEATURE_NAMES, FEATURE_PIPELINE_VERSION
+
+ARTIFACT_FORMAT = "har-linear-ovo"
+ARTIFACT_VERSION = 1
+ARTIFACT_ARRAYS = ("weights", "intercept", "classes", "prob_a", "prob_b")
+MIN_PROB = 1e-7   # libsvm clips pairwise probabilities to [MIN_PROB, 1 - MIN_PROB]
+
+
+def ovo_pairs(n_classes):
+    """(i, j) class-index pairs in libsvm's one-vs-one order"""
+    return [(i, j) for i in range(n_classes) for j in range(i + 1, n_classes)]
+
+
+def coupled_probabilities(r):
+    """Multiclass probabilities from pairwise ones (Wu, Lin & Weng 2004, as in libsvm).
+
+    r is (n, k, k) with r[:, i, j] = P(y=i | y in {i, j}); returns (n, k).
+    Samples are iterated together, each stopping once it meets libsvm's
+    convergence test, so results match svm_predict_probability.
+    """
+    n, k, _ = r.shape
+    eye = np.eye(k, dtype=bool)
+    r_t = r.transpose(0, 2, 1)
+    Q = -r_t * r
+    Q[:, eye] = (r ** 2 * ~eye).sum(axis=1)    # Q[t, t] = sum over j != t of r[j, t]^2
+    p = np.full((n, k), 1.0 / k)
+    active = np.ones(n, dtype=bool)
+    eps = 0.005 / k
+    for _ in range(max(100, k)):
+        Qp = np.einsum('nij,nj->ni', Q, p)
+        pQp = np.einsum('ni,ni->n', p, Qp)
+        active &= np.abs(Qp - pQp[:, None]).max(axis=1) >= eps
+        if not active.any():
+            break
+        for t in range(k):
+            a = active
+            diff = (-Qp[a, t] + pQp[a]) / Q[a, t, t]
+            p[a, t] += diff
+            pQp[a] = (pQp[a] + diff * (diff * Q[a, t, t] + 2 * Qp[a, t])) / (1 + diff) ** 2
+            Qp[a] = (Qp[a] + diff[:, None] * Q[a, t, :]) / (1 + diff)[:, None]
+            p[a] /= (1 + diff)[:, None]
+    return p
+
+
+class CompiledPredictor:
+    """Scaler + linear one-vs-one SVC evaluated as a single matrix multiply.
+
+    The scaler is folded into the pairwise decision weights, so decision values
+    for raw (unscaled) feature rows are X @ weights.T + intercept. Votes and
+    tie-breaking follow libsvm (positive decision votes for the first class of
+    the pair, ties go to the lowest class index). `feature_columns`, if set,
+    are the indices into the full feature vector (FEATURE_NAMES) that the
+    weight columns correspond to; the extractor only needs to compute those.
+    """
+
+    def __init__(self, weights, intercept, classes, prob_a=None, prob_b=None, activity_mapping=None,
+                 feature_columns=None):
+        self.weights = np.asarray(weights)      # plain views, also of read-only memory maps
+        self.intercept = np.asarray(intercept)
+        self.classes_ = np.asarray(classes)
+        self.activity_mapping = activity_mapping
+        self.prob_a = prob_a if prob_a is not None and len(prob_a) else None
+        self.prob_b = prob_b if prob_b is not None and len(prob_b) else None
+        self.feature_columns = None if feature_columns is None else np.asarray(feature_columns, dtype=np.intp)
+        self.n_features_in_ = weights.shape[1]
+        k = len(self.classes_)
+        pairs = np.array(ovo_pairs(k)).reshape(-1, 2)
+        self.pairs = pairs
+        first = np.zeros((len(pairs), k))
+        second = np.zeros((len(pairs), k))
+        first[np.arange(len(pairs)), pairs[:, 0]] = 1
+        second[np.arange(len(pairs)), pairs[:, 1]] = 1
+        self._vote_delta = first - second
+        self._vote_base = second.sum(axis=0)
+
+    @property
+    def has_proba(self):
+        return self.prob_a is not None
+
+    def fingerprint(self):
+        """Digest of the decision parameters; changes whenever predictions could"""
+        h = hashlib.sha256()
+        for arr in (self.weights, self.intercept, self.classes_, self.prob_a, self.prob_b, self.feature_columns):
+            if arr is not None:
+                h.update(np.ascontiguousarray(arr).tobytes())
+        return h.hexdigest()[:16]
+
+    def decision_function(self, X):
+        """(n, n_pairs) one-vs-one decision values for raw feature rows"""
+        return np.asarray(X, dtype=float) @ self.weights.T + self.intercept
+
+    def votes(self, dec):
+        return (dec > 0) @ self._vote_delta + self._vote_base
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.votes(self.decision_function(X)), axis=1)]
+
+    def _proba_from_decision(self, dec):
+        f = dec * self.prob_a + self.prob_b
+        e = np.exp(-np.abs(f))    # libsvm's overflow-safe sigmoid 1 / (1 + exp(f))
+        pair_p = np.where(f >= 0, e / (1 + e), 1 / (1 + e))
+        pair_p = np.clip(pair_p, MIN_PROB, 1 - MIN_PROB)
+        k = len(self.classes_)
+        r = np.zeros((len(dec), k, k))
+        r[:, self.pairs[:, 0], self.pairs[:, 1]] = pair_p
+        r[:, self.pairs[:, 1], self.pairs[:, 0]] = 1 - pair_p
+        return coupled_probabilities(r)
+
+    def predict_proba(self, X):
+        if not self.has_proba:
+            raise AttributeError("Model was trained without probability estimates")
+        return self._proba_from_decision(self.decision_function(X))
+
+    def predict_and_proba(self, X):
+        """(labels, probabilities or None) from a single decision-value evaluation"""
+        dec = self.decision_function(X)
+        labels = self.classes_[np.argmax(self.votes(dec), axis=1)]
+        return labels, (self._proba_from_decision(dec) if self.has_proba else None)
+
+
+class SklearnPredictor:
+    """Reference path: scaler.transform then the sklearn estimator, same interface as CompiledPredictor"""
+
+    feature_columns = None
+
+    def __init__(self, scaler, model, activity_mapping=None):
+        self.scaler = scaler
+        self.model = model
+        self.activity_mapping = activity_mapping
+        self.classes_ = model.classes_
+        self.n_features_in_ = scaler.n_features_in_
+
+    @property
+    def has_proba(self):
+        return hasattr(self.model, 'predict_proba')
+
+    def fingerprint(self):
+        return hashlib.sha256(pickle.dumps((self.scaler, self.model))).hexdigest()[:16]
+
+    def predict(self, X):
+        return self.model.predict(self.scaler.transform(X))
+
+    def predict_proba(self, X):
+        return self.model.predict_proba(self.scaler.transform(X))
+
+    def predict_and_proba(self, X):
+        X = self.scaler.transform(X)
+        return self.model.predict(X), (self.model.predict_proba(X) if self.has_proba else None)
+
+
+def compile_predictor(predictor):
+    """CompiledPredictor from a HARPredictor wrapping StandardScaler + SVC(kernel='linear')"""
+    model, scaler = predictor.model, predictor.scaler
+    if getattr(model, 'kernel', None) != 'linear' or not hasattr(model, 'coef_'):
+        raise ValueError("Only linear-kernel SVC models can be compiled")
+    coef = np.asarray(model.coef_, dtype=float)
+    intercept = np.asarray(model.intercept_, dtype=float)
+    if len(model.classes_) == 2:
+        # sklearn flips the binary decision sign relative to libsvm
+        coef, intercept = -coef, -intercept
+    mean = scaler.mean_ if getattr(scaler, 'mean_', None) is not None else 0.0
+    scale = scaler.scale_ if getattr(scaler, 'scale_', None) is not None else 1.0
+    weights = coef / scale
+    intercept = intercept - weights @ np.broadcast_to(mean, (coef.shape[1],))
+    prob_a = getattr(model, 'probA_', None) if getattr(model, 'probability', False) else None
+    prob_b = getattr(model, 'probB_', None) if getattr(model, 'probability', False) else None
+    return CompiledPredictor(np.ascontiguousarray(weights), intercept, model.classes_, prob_a, prob_b,
+                             getattr(predictor, 'activity_mapping', None))
+
+
+def prune_predictor(compiled, keep, fill):
+    """CompiledPredictor that reads only the feature columns `keep` (indices into FEATURE_NAMES).
+
+    Every other column is imputed with its `fill` value (e.g. the training
+    mean, which scales to zero). That constant contribution is folded into
+    the intercept, so the pruned model equals the full one with those
+    columns held at `fill`.
+    """
+    current = (np.arange(compiled.n_features_in_) if compiled.feature_columns is None
+               else compiled.feature_columns)
+    position = {c: i for i, c in enumerate(current.tolist())}
+    keep = np.asarray(keep, dtype=np.intp)
+    missing = [c for c in keep.tolist() if c not in position]
+    if missing:
+        raise ValueError(f"Columns {missing[:5]} are not inputs of this predictor")
+    kept = [position[c] for c in keep.tolist()]
+    dropped = np.setdiff1d(np.arange(len(current)), kept)
+    weights = np.asarray(compiled.weights)
+    intercept = compiled.intercept + weights[:, dropped] @ np.asarray(fill, dtype=float)[current[dropped]]
+    return CompiledPredictor(np.ascontiguousarray(weights[:, kept]), intercept, compiled.classes_,
+                             compiled.prob_a, compiled.prob_b, compiled.activity_mapping, keep)
+
+
+def build_inference(predictor, compiled=True):
+    """Compiled predictor when possible, otherwise the sklearn reference path"""
+    if compiled:
+        try:
+            return compile_predictor(predictor)
+        except ValueError as e:
+            print(f"Compiled inference unavailable ({e}); using sklearn")
+    return SklearnPredictor(predictor.scaler, predictor.model, getattr(predictor, 'activity_mapping', None))
+
+
+def save_artifact(compiled, path):
+    """Write a CompiledPredictor as manifest.json plus one .npy file per array"""
+    os.makedirs(path, exist_ok=True)
+    arrays = {}
+    for name in ARTIFACT_ARRAYS:
+        value = getattr(compiled, name if name != "classes" else "classes_")
+        if value is None:
+            continue
+        arrays[name] = f"{name}.npy"
+        np.save(os.path.join(path, arrays[name]), np.ascontiguousarray(value))
+    mapping = compiled.activity_mapping or {}
+    manifest = {
+        "format": ARTIFACT_FORMAT,
+        "version": ARTIFACT_VERSION,
+        "feature_pipeline_version": FEATURE_PIPELINE_VERSION,
+        "n_features": int(compiled.n_features_in_),
+        "activity_mapping": {str(k): v for k, v in mapping.items()},
+        "columns": None if compiled.feature_columns is None else [FEATURE_NAMES[c] for c in compiled.feature_columns],
+        "arrays": arrays,
+    }
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_artifact(path, mmap=True):
+    """CompiledPredictor from an artifact directory.
+
+    With mmap the weight files are mapped read-only, so every worker process
+    shares one copy through the page cache and loading costs no parsing.
+    """
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != ARTIFACT_FORMAT or manifest.get("version") != ARTIFACT_VERSION:
+        raise ValueError(f"Unsupported model artifact {manifest.get('format')} v{manifest.get('version')}")
+    if manifest.get("feature_pipeline_version") != FEATURE_PIPELINE_VERSION:
+        raise ValueError(f"Artifact built for feature pipeline v{manifest.get('feature_pipeline_version')}, "
+                         f"running v{FEATURE_PIPELINE_VERSION}")
+    arrays = {name: np.load(os.path.join(path, fname), mmap_mode="r" if mmap else None, allow_pickle=False)
+              for name, fname in manifest["arrays"].items()}
+    classes = np.asarray(arrays["classes"])
+    mapping = {(int(k) if classes.dtype.kind in "iu" else k): v for k, v in manifest["activity_mapping"].items()}
+    columns = manifest.get("columns")
+    if columns is not None:
+        unknown = sorted(set(columns) - set(FEATURE_NAMES))
+        if unknown:
+            raise ValueError(f"Artifact needs unknown feature columns {unknown[:5]}")
+        index = {name: i for i, name in enumerate(FEATURE_NAMES)}
+        columns = [index[name] for name in columns]
+    return CompiledPredictor(arrays["weights"], arrays["intercept"], classes,
+                             arrays.get("prob_a"), arrays.get("prob_b"), mapping, columns)
+
+
+def load_predictor(artifact_path, pickle_path, compiled=True):
+    """Inference model from an artifact directory, falling back to the pickled HARPredictor"""
+    if compiled and os.path.isdir(artifact_path):
+        try:
+            return load_artifact(artifact_path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Model artifact {artifact_path} unusable ({e}); loading {pickle_path}")
+    import joblib
+    return build_inference(joblib.load(pickle_path), compiled)
+
+
+if __name__ == "__main__":
+    import argparse
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Export a pickled HARPredictor as a memory-mappable model artifact")
+    parser.add_argument("pickle_path", nargs="?", default="har_predictor_complete.pkl")
+    parser.add_argument("artifact_path", nargs="?", default="har_model_artifact")
+    args = parser.parse_args()
+
+    save_artifact(compile_predictor(joblib.load(args.pickle_path)), args.artifact_path)
+    print(f"✓ Exported {args.pickle_path} -> {args.artifact_path}")
@@ -0,0 +1,261 @@
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from har_utils import FS, WIN_S, hann_taper, rfft_bins, sliding_windows
+
+CHANNELS = ("acc_x", "acc_y", "acc_z", "gyro_x", "gyro_y", "gyro_z")
+PREVIEW_FACTOR = 4          # samples per bucket grow by this much from one pyramid level to the next
+PREVIEW_POINTS = int(os.environ.get("HAR_PREVIEW_POINTS", "1000"))          # overview points per channel
+PREVIEW_COLUMNS = int(os.environ.get("HAR_PREVIEW_COLUMNS", "200"))         # overview spectrogram frames
+PREVIEW_MAX_POINTS = int(os.environ.get("HAR_PREVIEW_MAX_POINTS", "5000"))  # cap on one zoom query
+PREVIEW_MEMORY_MB = float(os.environ.get("HAR_PREVIEW_MEMORY_MB", "256"))   # pyramids kept for zooming
+LTTB_OVERSAMPLE = 8         # LTTB picks from at most this many candidates per output point
+
+
+def lttb(x, y, n_out):
+    """(n_out, channels) indices picked per channel by largest-triangle-three-buckets.
+
+    x is (n,), y is (n, channels); the first and last points are always kept
+    and each bucket in between keeps the point spanning the largest triangle
+    with the previously kept point and the next bucket's mean.
+    """
+    n, channels = y.shape
+    if n_out >= n or n_out < 3:
+        return np.repeat(np.arange(n)[:, None], channels, axis=1)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    out = np.empty((n_out, channels), dtype=int)
+    out[0], out[-1] = 0, n - 1
+    cols = np.arange(channels)
+    a = np.zeros(channels, dtype=int)
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt = slice(hi, edges[i + 2]) if i + 2 < len(edges) else slice(n - 1, n)
+        cx, cy = x[nxt].mean(), y[nxt].mean(axis=0)
+        ax, ay = x[a], y[a, cols]
+        area = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi, None]) * (cy - ay))
+        a = lo + area.argmax(axis=0)
+        out[i + 1] = a
+    return out
+
+
+class SignalPyramid:
+    """Min/max decimation pyramid and spectrogram of a whole (n_samples, 6) recording.
+
+    Level 0 is the samples themselves (float32); level k holds the min and max
+    of every PREVIEW_FACTOR**k samples. The spectrogram is the Hann-tapered
+    magnitude spectrum of the acceleration magnitude over the classifier's
+    windows. Recordings are fed with append() chunk by chunk as they are
+    parsed and every level grows by reducing only the new rows, so nothing
+    is held twice; finish() closes the partial buckets. Each level is kept
+    as the blocks appended to it. Queries take sample ranges and return only
+    as many points as asked for, whatever the recording length.
+    """
+
+    def __init__(self, data=None, fs=FS, factor=PREVIEW_FACTOR, window=WIN_S, hop=WIN_S // 2):
+        self.fs = fs
+        self.factor = factor
+        self.n_samples = 0
+        self.levels = [([], [])]          # per level: min blocks, max blocks
+        self._carry = [None]              # per level k > 0: level k-1 rows of the unfinished bucket
+        self._offsets = None
+        self.window, self.hop = window, hop
+        self.freqs = rfft_bins(window, fs).astype(np.float32)
+        self._tail = np.zeros(0, dtype=np.float32)   # acceleration magnitude not yet in a full frame
+        self._frames = []
+        self.spectrum = None
+        self.nbytes = 0
+        if data is not None:
+            self.append(data)
+            self.finish()
+
+    def append(self, data):
+        """Add the next (rows, channels) samples of the recording"""
+        data = np.ascontiguousarray(np.asarray(data)[:, :len(CHANNELS)], dtype=np.float32)
+        if not len(data):
+            return
+        self.n_samples += len(data)
+        self.levels[0][0].append(data)
+        self.levels[0][1].append(data)
+        self._push(1, data, data)
+        tail = np.concatenate([self._tail, np.linalg.norm(data[:, :3], axis=1)])
+        frames = sliding_windows(tail, self.window, self.hop)
+        if len(frames):
+            from scipy.fft import rfft
+            frames = frames - frames.mean(axis=1, keepdims=True)   # drop gravity / DC
+            self._frames.append(np.abs(rfft(frames * hann_taper(self.window), axis=1)).astype(np.float32))
+        self._tail = tail[len(frames) * self.hop:]
+
+    def _push(self, k, lo, hi):
+        """Feed level k-1 rows to level k, reducing every completed bucket on up the levels"""
+        while len(lo):
+            if k == len(self.levels):
+                self.levels.append(([], []))
+                self._carry.append((lo[:0], hi[:0]))
+            carry_lo, carry_hi = self._carry[k]
+            lo, hi = np.concatenate([carry_lo, lo]), np.concatenate([carry_hi, hi])
+            full = len(lo) - len(lo) % self.factor
+            self._carry[k] = (lo[full:], hi[full:])
+            starts = np.arange(0, full, self.factor)
+            lo, hi = np.minimum.reduceat(lo[:full], starts), np.maximum.reduceat(hi[:full], starts)
+            if len(lo):
+                self.levels[k][0].append(lo)
+                self.levels[k][1].append(hi)
+            k += 1
+
+    def finish(self):
+        """Close the last, partial bucket of every level; call once after the last append()"""
+        k = 1
+        while k < len(self.levels):
+            carry_lo, carry_hi = self._carry[k]
+            if len(carry_lo):
+                self._carry[k] = (carry_lo[:0], carry_hi[:0])
+                lo, hi = carry_lo.min(axis=0, keepdims=True), carry_hi.max(axis=0, keepdims=True)
+                self.levels[k][0].append(lo)
+                self.levels[k][1].append(hi)
+                if k + 1 < len(self.levels):
+                    self._push(k + 1, lo, hi)
+            k += 1
+        self._offsets = [np.cumsum([0] + [len(b) for b in lo]) for lo, _ in self.levels]
+        # the coarsest level kept is the first one with at most `factor` buckets
+        top = next((k for k, offsets in enumerate(self._offsets) if offsets[-1] <= self.factor), len(self.levels) - 1)
+        del self.levels[top + 1:], self._offsets[top + 1:], self._carry[top + 1:]
+        self.spectrum = (np.concatenate(self._frames) if self._frames
+                         else np.zeros((0, len(self.freqs)), dtype=np.float32))
+        self._frames = []
+        self.nbytes = (sum(b.nbytes for b in self.levels[0][0]) + self.spectrum.nbytes +
+                       sum(b.nbytes for lo, hi in self.levels[1:] for b in lo + hi))
+        return self
+
+    def _rows(self, k, first, last):
+        """(min, max) of buckets [first, last) of level k, gathered from its blocks"""
+        offsets = self._offsets[k]
+        last = min(last, offsets[-1])
+        i, j = np.searchsorted(offsets, first, "right") - 1, np.searchsorted(offsets, last, "left")
+        lo_blocks, hi_blocks = self.levels[k]
+        lo = [lo_blocks[b][max(0, first - offsets[b]):last - offsets[b]] for b in range(i, j)]
+        hi = [hi_blocks[b][max(0, first - offsets[b]):last - offsets[b]] for b in range(i, j)]
+        return (lo[0], hi[0]) if len(lo) == 1 else (np.concatenate(lo), np.concatenate(hi))
+
+    @property
+    def duration(self):
+        return self.n_samples / self.fs
+
+    def _range(self, start, stop):
+        start = max(0, int(start))
+        stop = self.n_samples if stop is None else min(self.n_samples, int(stop))
+        if stop <= start:
+            raise ValueError(f"Empty range [{start}, {stop}) of {self.n_samples} samples")
+        return start, stop
+
+    def envelope(self, start=0, stop=None, points=PREVIEW_POINTS):
+        """{'t', 'min', 'max', 'samples_per_point'} for samples [start, stop) in at most `points` buckets.
+
+        Uses the finest level that fits, so min == max once the range has no
+        more than `points` samples.
+        """
+        start, stop = self._range(start, stop)
+        k = 0
+        while k + 1 < len(self.levels) and -(-(stop - start) // self.factor ** k) > points:
+            k += 1
+        size = self.factor ** k
+        first, last = start // size, -(-stop // size)
+        lo, hi = self._rows(k, first, last)
+        t = np.arange(first, last) * size / self.fs
+        return {
+            "t": t,
+            "min": {name: lo[:, c] for c, name in enumerate(CHANNELS)},
+            "max": {name: hi[:, c] for c, name in enumerate(CHANNELS)},
+            "samples_per_point": size,
+        }
+
+    def downsample(self, start=0, stop=None, points=PREVIEW_POINTS):
+        """{channel: {'t', 'y'}}: LTTB-selected points of each channel over [start, stop).
+
+        Candidates come from bucket midpoints of the finest level with at most
+        LTTB_OVERSAMPLE * points buckets in the range, so the cost stays bounded.
+        """
+        start, stop = self._range(start, stop)
+        k = 0
+        while k + 1 < len(self.levels) and -(-(stop - start) // self.factor ** k) > LTTB_OVERSAMPLE * points:
+            k += 1
+        size = self.factor ** k
+        first, last = start // size, -(-stop // size)
+        lo, hi = self._rows(k, first, last)
+        y = (lo + hi) / 2
+        t = (np.arange(first, last) + (0.5 if size > 1 else 0)) * size / self.fs
+        idx = lttb(t, y, points)
+        return {name: {"t": t[idx[:, c]], "y": y[idx[:, c], c]} for c, name in enumerate(CHANNELS)}
+
+    def spectrogram(self, start=0, stop=None, columns=PREVIEW_COLUMNS):
+        """{'t', 'freq', 'magnitude'} of the frames starting in [start, stop), max-pooled to `columns`"""
+        start, stop = self._range(start, stop)
+        first, last = -(-start // self.hop), min(len(self.spectrum), -(-stop // self.hop))
+        frames = self.spectrum[first:last]
+        t = np.arange(first, max(first, last)) * self.hop / self.fs
+        if len(frames) > columns:
+            starts = np.linspace(0, len(frames), columns, endpoint=False).astype(int)
+            frames, t = np.maximum.reduceat(frames, starts), t[starts]
+        return {"t": t, "freq": self.freqs, "magnitude": frames}
+
+
+class PreviewStore:
+    """Pyramids by preview id, least recently used evicted past `memory_bytes`.
+
+    Also remembers the last `max_refused` ids whose pyramid alone exceeded the
+    budget, so a response that went out without a preview can be reused.
+    """
+
+    def __init__(self, memory_bytes=int(PREVIEW_MEMORY_MB * 2**20), max_refused=1024):
+        self.memory_bytes = memory_bytes
+        self.max_refused = max_refused
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        self._refused = OrderedDict()
+        self._used = 0
+
+    def put(self, pyramid, preview_id=None):
+        """Store a pyramid under preview_id (a new one by default) and return the id (None if it alone exceeds the budget)"""
+        if pyramid.nbytes > self.memory_bytes:
+            if preview_id:
+                with self._lock:
+                    self._refused[preview_id] = True
+                    while len(self._refused) > self.max_refused:
+                        self._refused.popitem(last=False)
+            return None
+        preview_id = preview_id or uuid.uuid4().hex
+        with self._lock:
+            replaced = self._items.pop(preview_id, None)
+            if replaced is not None:
+                self._used -= replaced.nbytes
+            self._items[preview_id] = pyramid
+            self._used += pyramid.nbytes
+            while self._used > self.memory_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._used -= evicted.nbytes
+        return preview_id
+
+    def get(self, preview_id):
+        with self._lock:
+            pyramid = self._items.get(preview_id)
+            if pyramid is not None:
+                self._items.move_to_end(preview_id)
+            return pyramid
+
+    def reusable(self, preview_id):
+        """Whether a response made with preview_id is still valid: its pyramid is stored or was too large to store"""
+        return self.get(preview_id) is not None or preview_id in self._refused
+
+
+_preview_store = None
+
+
+def get_preview_store():
+    """Process-wide store sized by HAR_PREVIEW_MEMORY_MB"""
+    global _preview_store
+    if _preview_store is None:
+        _preview_store = PreviewStore()
+    return _preview_store
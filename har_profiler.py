@@ -0,0 +1,118 @@
+import cProfile
+import marshal
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Off unless HAR_PROFILING=1 and HAR_ADMIN_TOKEN is set; both asking for a
+# profile and reading one need the token in the X-Admin-Token header
+PROFILING_ENABLED = os.environ.get("HAR_PROFILING", "0") == "1"
+ADMIN_TOKEN = os.environ.get("HAR_ADMIN_TOKEN") or None
+PROFILE_RETENTION = int(os.environ.get("HAR_PROFILE_RETENTION", "20"))   # profiles kept for download
+PROFILE_TOP = 30   # functions listed in a summary
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _label(key):
+    path, line, func = key
+    if path == "~":
+        return func   # builtins, e.g. <method 'reduce' of 'numpy.ufunc' objects>
+    return f"{os.path.relpath(path, PROJECT_DIR) if path.startswith(PROJECT_DIR) else os.path.basename(path)}:{line}({func})"
+
+
+def summarize(stats, top=PROFILE_TOP):
+    """Project functions by cumulative time, and the top self-time hotspots anywhere"""
+    rows = [{"function": _label(key), "calls": nc, "self_s": tt, "cumulative_s": ct, "project": key[0].startswith(PROJECT_DIR)}
+            for key, (cc, nc, tt, ct, callers) in stats.items()]
+    project = sorted((r for r in rows if r.pop("project")), key=lambda r: -r["cumulative_s"])
+    return {
+        "functions": project[:top],
+        "hotspots": sorted(rows, key=lambda r: -r["self_s"])[:top],
+    }
+
+
+class Profile:
+    def __init__(self, info):
+        self.id = uuid.uuid4().hex
+        self.info = info
+        self.created_at = time.time()
+        self.wall_s = None
+        self.error = None
+        self.stats = {}
+
+    def summary(self, detail=False):
+        out = {"profile_id": self.id, **self.info, "created_at": self.created_at, "wall_s": self.wall_s,
+               "error": self.error, "download_url": f"/api/admin/profiles/{self.id}/download"}
+        if detail:
+            out.update(summarize(self.stats))
+        return out
+
+    def dump(self):
+        """The profile in pstats' file format (load with pstats.Stats or snakeviz)"""
+        return marshal.dumps(self.stats)
+
+
+class Profiler:
+    """Deterministic (cProfile) capture of single requests, kept for later download.
+
+    run() profiles a call in the calling thread, so it must wrap the work on
+    the thread that does it (inside run_in_executor, not around it). Time
+    spent in other threads or processes, i.e. the inference scheduler and a
+    feature process pool, shows up as waiting. Only the newest `retention`
+    profiles are kept. Requests that did not ask for a profile never reach it.
+    Profiles expose code paths and timings, so without an admin token the
+    profiler stays disabled.
+    """
+
+    def __init__(self, enabled=PROFILING_ENABLED, token=ADMIN_TOKEN, retention=PROFILE_RETENTION):
+        if enabled and not token:
+            print(" Profiling disabled: HAR_PROFILING=1 also needs HAR_ADMIN_TOKEN")
+            enabled = False
+        self.enabled = enabled
+        self.token = token
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._profiles = OrderedDict()
+
+    def run(self, fn, info):
+        """(fn(), profile id); the profile is stored even if fn raises"""
+        profile = Profile(info)
+        prof = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            return prof.runcall(fn), profile.id
+        except BaseException as e:
+            profile.error = str(getattr(e, "detail", e))
+            raise
+        finally:
+            profile.wall_s = time.perf_counter() - start
+            prof.create_stats()
+            profile.stats = prof.stats
+            self._store(profile)
+
+    def _store(self, profile):
+        with self._lock:
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self.retention:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id):
+        return self._profiles.get(profile_id)
+
+    def list(self):
+        with self._lock:
+            return [p.summary() for p in reversed(self._profiles.values())]
+
+
+_profiler = None
+
+
+def get_profiler():
+    """Process-wide profiler configured from HAR_PROFILING / HAR_ADMIN_TOKEN / HAR_PROFILE_RETENTION"""
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler()
+    return _profiler
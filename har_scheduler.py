@@ -0,0 +1,226 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+from har_metrics import metrics
+
+# Windows from concurrent requests are coalesced into one inference call; the
+# first queued matrix waits at most HAR_BATCH_DELAY_MS for others to join it
+BATCHING = os.environ.get("HAR_BATCHING", "1") != "0"
+BATCH_DELAY = float(os.environ.get("HAR_BATCH_DELAY_MS", "2")) / 1000
+BATCH_MAX_WINDOWS = int(os.environ.get("HAR_BATCH_MAX_WINDOWS", "4096"))
+# Admission control; 0 disables either limit
+MAX_INFLIGHT = int(os.environ.get("HAR_MAX_INFLIGHT", str(4 * (os.cpu_count() or 1))))   # requests + streams
+MAX_QUEUE_WINDOWS = int(os.environ.get("HAR_MAX_QUEUE_WINDOWS", "65536"))
+# Open WebSocket streams, limited separately: an idle stream holds no inference slot
+MAX_STREAMS = int(os.environ.get("HAR_MAX_STREAMS", "256"))
+
+
+class SchedulerSaturated(Exception):
+    """Raised by acquire() when no more work is accepted; status is 429 or 503"""
+
+    def __init__(self, status, detail, retry_after):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class _Item:
+    __slots__ = ("X", "proba", "queued_at", "done", "labels", "probabilities", "error")
+
+    def __init__(self, X, proba):
+        self.X = X
+        self.proba = proba
+        self.queued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.labels = self.probabilities = self.error = None
+
+
+class InferenceScheduler:
+    """Micro-batching front for a predictor, shared by every request and stream.
+
+    predict / predict_and_proba queue the caller's feature matrix and block
+    until a single worker thread has classified it together with whatever
+    else was queued within `max_delay` (up to `max_batch` windows). The
+    worker only waits when more admitted callers than queued matrices exist,
+    so a lone request is never delayed. When the queue holds `max_queue`
+    windows, callers block until it drains (backpressure); acquire() refuses
+    new work up front instead: 429 past `max_inflight` callers, 503 while the
+    queue is full. Streams are admitted by open_stream() against their own
+    `max_streams` limit and only count as in flight while a pushed batch is
+    being classified. Other attributes are read from the predictor.
+    """
+
+    def __init__(self, predictor, batching=BATCHING, max_delay=BATCH_DELAY, max_batch=BATCH_MAX_WINDOWS,
+                 max_inflight=MAX_INFLIGHT, max_queue=MAX_QUEUE_WINDOWS, max_streams=MAX_STREAMS):
+        self.predictor = predictor
+        self.batching = batching
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.max_streams = max_streams
+        self._cond = threading.Condition()
+        self._pending = deque()
+        self._queued = 0        # windows in _pending
+        self._inflight = 0      # admitted callers
+        self._streams = 0       # open streams
+        self._rate = None       # windows/s, moving average over batches
+        self._thread = None
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self.predictor, name)
+
+    def status(self):
+        with self._cond:
+            return {"queue_windows": self._queued, "queue_batches": len(self._pending), "inflight": self._inflight,
+                    "max_inflight": self.max_inflight, "max_queue_windows": self.max_queue,
+                    "streams": self._streams, "max_streams": self.max_streams}
+
+    def retry_after(self):
+        """Seconds until the current queue should have drained (at least 1)"""
+        rate = self._rate or 0
+        return max(1, math.ceil(self._queued / rate)) if rate else 1
+
+    def acquire(self, limit=True):
+        """Count the caller as in flight; with limit, refuse it when saturated (SchedulerSaturated)"""
+        with self._cond:
+            if limit and self.max_inflight and self._inflight >= self.max_inflight:
+                metrics.inc("har_rejected_total", reason="inflight")
+                raise SchedulerSaturated(429, f"Too many requests in progress ({self._inflight})", self.retry_after())
+            if limit and self.max_queue and self._queued >= self.max_queue:
+                metrics.inc("har_rejected_total", reason="queue")
+                raise SchedulerSaturated(503, f"Inference queue is full ({self._queued} windows)", self.retry_after())
+            self._inflight += 1
+            metrics.set("har_inflight_requests", self._inflight)
+
+    def release(self):
+        with self._cond:
+            self._inflight -= 1
+            metrics.set("har_inflight_requests", self._inflight)
+            self._cond.notify_all()
+
+    @contextmanager
+    def admit(self, limit=True):
+        self.acquire(limit)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def open_stream(self):
+        """Count a new stream; SchedulerSaturated(429) past `max_streams`"""
+        with self._cond:
+            if self.max_streams and self._streams >= self.max_streams:
+                metrics.inc("har_rejected_total", reason="streams")
+                raise SchedulerSaturated(429, f"Too many open streams ({self._streams})", self.retry_after())
+            self._streams += 1
+            metrics.set("har_open_streams", self._streams)
+
+    def close_stream(self):
+        with self._cond:
+            self._streams -= 1
+            metrics.set("har_open_streams", self._streams)
+
+    def predict(self, X):
+        if not self.batching:
+            with metrics.stage("inference"):
+                return self.predictor.predict(X)
+        return self._submit(X, False).labels
+
+    def predict_and_proba(self, X):
+        if not self.batching:
+            with metrics.stage("inference"):
+                return self.predictor.predict_and_proba(X)
+        item = self._submit(X, True)
+        return item.labels, item.probabilities
+
+    def _submit(self, X, proba):
+        item = _Item(X, proba)
+        with self._cond:
+            # backpressure: wait for room, unless the queue is empty (oversized matrices still run alone)
+            while self.max_queue and self._queued and self._queued + len(X) > self.max_queue:
+                self._cond.wait()
+            self._pending.append(item)
+            self._queued += len(X)
+            metrics.set("har_inference_queue_windows", self._queued)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="har-inference", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        item.done.wait()
+        if item.error is not None:
+            raise item.error
+        return item
+
+    def _take_batch(self):
+        """Pop the next batch, waiting for more callers while the latency budget allows; None once closed"""
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return None
+            deadline = self._pending[0].queued_at + self.max_delay
+            while (self._queued < self.max_batch and self._inflight > len(self._pending) and not self._closed
+                   and time.perf_counter() < deadline):
+                self._cond.wait(deadline - time.perf_counter())
+            batch, n = [], 0
+            while self._pending and (not batch or n + len(self._pending[0].X) <= self.max_batch):
+                item = self._pending.popleft()
+                batch.append(item)
+                n += len(item.X)
+            self._queued -= n
+            metrics.set("har_inference_queue_windows", self._queued)
+            self._cond.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            start = time.perf_counter()
+            for item in batch:
+                metrics.observe("har_stage_seconds", start - item.queued_at, stage="queue")
+            try:
+                X = batch[0].X if len(batch) == 1 else np.concatenate([item.X for item in batch])
+                with metrics.stage("inference"):
+                    if any(item.proba for item in batch):
+                        labels, proba = self.predictor.predict_and_proba(X)
+                    else:
+                        labels, proba = self.predictor.predict(X), None
+                offset = 0
+                for item in batch:
+                    stop = offset + len(item.X)
+                    item.labels = labels[offset:stop]
+                    item.probabilities = proba[offset:stop] if proba is not None and item.proba else None
+                    offset = stop
+            except Exception as e:
+                for item in batch:
+                    item.error = e
+            finally:
+                for item in batch:
+                    item.done.set()
+            elapsed = time.perf_counter() - start
+            if elapsed > 0:
+                rate = sum(len(item.X) for item in batch) / elapsed
+                self._rate = rate if self._rate is None else 0.8 * self._rate + 0.2 * rate
+            metrics.inc("har_inference_batches_total")
+
+    def shutdown(self):
+        """Finish queued work and stop the worker thread; the next submission starts a new one"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
+        with self._cond:
+            self._closed = False
@@ -0,0 +1,79 @@
+import json
+import numpy as np
+from har_utils import FEATURE_DTYPE, WIN_S, process_sliding_windows, process_windows_batch
+
+HOP_S = WIN_S // 2   # 50% overlap, same geometry as /api/predict
+
+
+class StreamFeatureExtractor:
+    """Incremental feature extraction over a continuous (n_samples, channels) stream.
+
+    Keeps only the samples not yet consumed by a complete window (fewer than
+    `window`), so memory per stream stays O(window) regardless of length.
+    Each push featurizes the windows it completes with process_sliding_windows
+    (or executor.sliding_features when an executor is given), which shares
+    derived signals and moment sums between overlapping windows. With a
+    WindowFeatureCache, windows seen before are served from the cache.
+    `columns` restricts the features to those a pruned predictor reads.
+    """
+
+    def __init__(self, window=WIN_S, hop=HOP_S, channels=6, executor=None, cache=None, columns=None):
+        self.window = window
+        self.hop = hop
+        self.channels = channels
+        self.executor = executor
+        self.columns = None if columns is None else tuple(int(c) for c in columns)
+        self.cache = cache if cache is not None and cache.enabled else None
+        self.tail = np.zeros((0, channels), dtype=FEATURE_DTYPE)
+        self.total = 0
+        self.emitted = 0
+
+    def push(self, samples):
+        """Append samples; return the feature rows of the windows they complete."""
+        samples = np.asarray(samples, dtype=FEATURE_DTYPE).reshape(-1, self.channels)
+        self.total += len(samples)
+        data = np.concatenate([self.tail, samples]) if len(self.tail) else samples
+        if self.cache is not None:
+            features = self.cache.sliding_features(data, self.window, self.hop, self._sliding, self._windows,
+                                                   self.columns)
+        else:
+            features = self._sliding(data)
+        self.tail = data[len(features) * self.hop:].copy()
+        self.emitted += len(features)
+        return features
+
+    def _sliding(self, data):
+        if self.executor is not None:
+            return self.executor.sliding_features(data, self.window, self.hop, self.columns)
+        return process_sliding_windows(data[:, :3], data[:, 3:6], self.window, self.hop, columns=self.columns)
+
+    def _windows(self, acc_windows, gyro_windows):
+        if self.executor is not None:
+            return self.executor.windows_features(acc_windows, gyro_windows, self.columns)
+        return process_windows_batch(acc_windows, gyro_windows, columns=self.columns)
+
+    def window_start(self, index):
+        """Sample offset of the index-th emitted window."""
+        return index * self.hop
+
+
+def decode_samples(message, channels=6):
+    """Decode one WebSocket message into an (n, channels) float array.
+
+    Text frames are JSON objects {"samples": [[acc_x, ..., gyro_z], ...]};
+    binary frames are little-endian float32 values in row-major order.
+    """
+    if message.get("bytes") is not None:
+        raw = message["bytes"]
+        if len(raw) % (4 * channels):
+            raise ValueError(f"Binary frame must hold a whole number of {channels}-channel float32 samples")
+        return np.frombuffer(raw, dtype='<f4').reshape(-1, channels).astype(FEATURE_DTYPE)
+    payload = json.loads(message.get("text") or "{}")
+    if not isinstance(payload, dict):
+        raise ValueError('Text frames must be JSON objects like {"samples": [[...], ...]}')
+    samples = np.asarray(payload.get("samples", []), dtype=FEATURE_DTYPE)
+    if samples.size == 0:
+        return np.zeros((0, channels))
+    if samples.ndim != 2 or samples.shape[1] < channels:
+        raise ValueError(f"Expected samples as rows of at least {channels} values")
+    return samples[:, :channels]
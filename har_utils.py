@@ -1,17 +1,50 @@
-import pandas as pd
+import os
 import numpy as np
-import joblib
-from scipy.signal import medfilt, butter, filtfilt
-from scipy.fft import rfft, rfftfreq
-from scipy.stats import skew, kurtosis
+from functools import lru_cache
+from numpy.lib.stride_tricks import sliding_window_view
+
+# pandas, scipy.signal and scipy.fft are imported where they are used, so that
+# importing this module (and the API) stays cheap until features are computed
 
 FS = 50        # Hz
 WIN_S = 128    # 2.56 s window
 
+# HAR_FLOAT32=1 runs parsing, windowing, filtering, FFT and the feature maths in
+# single precision (half the working set); features are widened for inference
+FEATURE_DTYPE = np.dtype(np.float32 if os.environ.get("HAR_FLOAT32", "0") == "1" else np.float64)
+
+# DSP constants are cached per (fs, cutoff, order, N); the LRU bound keeps
+# clients with unusual sampling rates or window lengths from growing memory
+DSP_CACHE_SIZE = 32
+
+def _frozen(arr):
+    arr.setflags(write=False)
+    return arr
+
+@lru_cache(maxsize=DSP_CACHE_SIZE)
+def lowpass_sos(cutoff, fs=FS, order=3):
+    """Butterworth low-pass design in second-order sections (shared; do not modify)"""
+    from scipy.signal import butter
+    # left writable: scipy's sosfilt rejects read-only coefficient buffers
+    return butter(order, cutoff / (0.5 * fs), btype='low', output='sos')
+
+@lru_cache(maxsize=DSP_CACHE_SIZE)
+def hann_taper(N):
+    return _frozen(np.hanning(N))
+
+@lru_cache(maxsize=DSP_CACHE_SIZE)
+def rfft_bins(N, fs=FS):
+    from scipy.fft import rfftfreq
+    return _frozen(rfftfreq(N, 1/fs))
+
+@lru_cache(maxsize=DSP_CACHE_SIZE)
+def spectral_band_edges(n_bins, nbands=8):
+    """Start/stop indices splitting n_bins rfft bins into nbands contiguous bands"""
+    return _frozen(np.linspace(0, n_bins, nbands + 1, dtype=int))
+
 def butter_lowpass_filter(data, cutoff, fs=50, order=3):
-    nyq = 0.5 * fs
-    b, a = butter(order, cutoff / nyq, btype='low')
-    return filtfilt(b, a, data, axis=0)
+    from scipy.signal import sosfiltfilt
+    return sosfiltfilt(lowpass_sos(cutoff, fs, order), data, axis=0)
 
 def compute_gravity(total_acc):
     return butter_lowpass_filter(total_acc, 0.3, order=4)
@@ -20,115 +53,535 @@ def compute_jerk(signal):
     return np.gradient(signal, axis=0) * 50
 
 def magnitude(signal):
-    return np.sqrt(np.sum(signal**2, axis=1))
+    return np.sqrt(np.sum(signal**2, axis=-1))
 
-def ar_coeffs_lstsq(x, order=4):
-    x = np.asarray(x).flatten()
-    N = x.size
+WINDOW_PADDING = ('drop', 'zero', 'edge')
+
+def window_count(n_samples, window=WIN_S, hop=WIN_S // 2, pad='drop'):
+    """Number of windows sliding_windows makes from n_samples"""
+    if pad == 'drop':
+        return (n_samples - window) // hop + 1 if n_samples >= window else 0
+    return -(-max(n_samples - window, 0) // hop) + 1 if n_samples else 0
+
+def sliding_windows(data, window=WIN_S, hop=WIN_S // 2, pad='drop'):
+    """(n_windows, window, channels) windows, `hop` samples apart, of an (n_samples, channels) array.
+
+    With pad='drop' a tail shorter than a window is left out and the result is
+    a read-only strided view of data (nothing is copied). 'zero' and 'edge'
+    pad the tail with zeros or the last sample so every sample falls in a
+    window; that copies the recording once.
+    """
+    if pad not in WINDOW_PADDING:
+        raise ValueError(f"Unknown padding {pad!r}; use one of {', '.join(WINDOW_PADDING)}")
+    data = np.asarray(data)
+    n_windows = window_count(len(data), window, hop, pad)
+    if n_windows == 0:
+        return np.empty((0, window) + data.shape[1:], dtype=data.dtype)
+    extra = (n_windows - 1) * hop + window - len(data)
+    if extra > 0:
+        data = np.pad(data, [(0, extra)] + [(0, 0)] * (data.ndim - 1), mode='constant' if pad == 'zero' else 'edge')
+    return np.moveaxis(sliding_window_view(data, window, axis=0)[::hop][:n_windows], -1, 1)
+
+TIME_FEATURES = ('mean', 'std', 'mad', 'max', 'min', 'meanAbs', 'energy', 'iqr', 'entropy',
+                 'arCoeff1', 'arCoeff2', 'arCoeff3', 'arCoeff4', 'skewness', 'kurtosis')
+FREQ_FEATURES = ('fMeanFreq', 'fMaxFreq', 'fSkewness', 'fKurtosis') + tuple(f'fBand{i}' for i in range(1, 9))
+N_TIME_FEATURES = len(TIME_FEATURES)
+N_FREQ_FEATURES = len(FREQ_FEATURES)
+# What has to be computed for each per-signal feature; a graph built for a
+# subset of columns only runs the groups those columns need
+FEATURE_GROUPS = ('moments', 'moments', 'robust', 'moments', 'moments', 'moments', 'moments', 'robust',
+                  'entropy', 'ar', 'ar', 'ar', 'ar', 'moments', 'moments') + ('spectrum',) * N_FREQ_FEATURES
+TIME_GROUPS = frozenset(FEATURE_GROUPS[:N_TIME_FEATURES])
+N_FEATURES = 20 * (N_TIME_FEATURES + N_FREQ_FEATURES)
+# Bump whenever feature values or their order change; exported models record it
+FEATURE_PIPELINE_VERSION = "1"
+
+def block_stats(x, block):
+    """Moment sums of consecutive `block`-sample blocks along the last axis.
+
+    Returns a dict of (..., n_blocks) arrays: sample count, mean, central
+    moment sums M2-M4, min, max, sum of |x| and sum of x**2.
+    """
+    nb = x.shape[-1] // block
+    b = x[..., :nb * block].reshape(x.shape[:-1] + (nb, block))
+    mean = b.mean(axis=-1)
+    d = b - mean[..., None]
+    d2 = d * d
+    return {
+        'n': np.full(mean.shape, block, dtype=mean.dtype),
+        'mean': mean,
+        'M2': d2.sum(axis=-1),
+        'M3': (d2 * d).sum(axis=-1),
+        'M4': (d2 * d2).sum(axis=-1),
+        'min': b.min(axis=-1),
+        'max': b.max(axis=-1),
+        'abs_sum': np.abs(b).sum(axis=-1),
+        'sq_sum': (b * b).sum(axis=-1),
+    }
+
+def merge_stats(a, b):
+    """Moment sums of two adjacent blocks combined (Chan et al. pairwise update)."""
+    na, nb = a['n'], b['n']
+    n = na + nb
+    delta = b['mean'] - a['mean']
+    d_n = delta / n
+    d_n2 = d_n * d_n
+    term1 = delta * d_n * na * nb
+    M2 = a['M2'] + b['M2'] + term1
+    M3 = a['M3'] + b['M3'] + term1 * d_n * (na - nb) + 3 * d_n * (na * b['M2'] - nb * a['M2'])
+    M4 = (a['M4'] + b['M4'] + term1 * d_n2 * (na * na - na * nb + nb * nb)
+          + 6 * d_n2 * (na * na * b['M2'] + nb * nb * a['M2'])
+          + 4 * d_n * (na * b['M3'] - nb * a['M3']))
+    return {
+        'n': n,
+        'mean': a['mean'] + d_n * nb,
+        'M2': M2,
+        'M3': M3,
+        'M4': M4,
+        'min': np.minimum(a['min'], b['min']),
+        'max': np.maximum(a['max'], b['max']),
+        'abs_sum': a['abs_sum'] + b['abs_sum'],
+        'sq_sum': a['sq_sum'] + b['sq_sum'],
+    }
+
+def window_stats(blocks, per_window):
+    """Stats of every run of `per_window` consecutive blocks (windows hopping one block at a time)."""
+    nw = blocks['n'].shape[-1] - per_window + 1
+    out = {k: v[..., :nw] for k, v in blocks.items()}
+    for j in range(1, per_window):
+        out = merge_stats(out, {k: v[..., j:j + nw] for k, v in blocks.items()})
+    return out
+
+def _row_stats(x):
+    return {k: v[..., 0] for k, v in block_stats(x, x.shape[-1]).items()}
+
+def _skew_kurtosis_from_stats(stats):
+    """Biased skewness and Fisher kurtosis (scipy.stats semantics) from moment sums."""
+    n = stats['n']
+    m2 = stats['M2'] / n
+    zero = m2 <= (np.finfo(m2.dtype).resolution * stats['mean'])**2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sk = np.where(zero, np.nan, stats['M3'] / n / m2**1.5)
+        kt = np.where(zero, np.nan, stats['M4'] / n / m2**2 - 3.0)
+    return sk, kt
+
+def signal_entropy_batch(x, bins=30):
+    """Row-wise equivalent of signal_entropy for a (M, N) array of non-constant rows."""
+    M, N = x.shape
+    mn = x.min(axis=1)
+    mx = x.max(axis=1)
+    flat = mx == mn
+    mn = np.where(flat, mn - 0.5, mn)
+    mx = np.where(flat, mx + 0.5, mx)
+    edges = np.linspace(mn, mx, bins + 1, axis=1)
+    f_indices = ((x - mn[:, None]) / (mx - mn)[:, None]) * bins
+    idx = f_indices.astype(np.intp)
+    idx[idx == bins] -= 1
+    # same 1-ULP edge corrections as np.histogram
+    idx -= x < np.take_along_axis(edges, idx, axis=1)
+    idx += (x >= np.take_along_axis(edges, idx + 1, axis=1)) & (idx != bins - 1)
+    counts = np.bincount((idx + bins * np.arange(M)[:, None]).ravel(), minlength=M * bins)
+    hist = counts.reshape(M, bins) / np.diff(edges, axis=1) / N
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = np.where(hist > 0, hist * np.log2(hist + 1e-12), 0.0)
+    entropy = -terms.sum(axis=1)
+    return np.where(np.isfinite(entropy), entropy, 0.0)
+
+def ar_coeffs_batch(x, order=4):
+    """Row-wise AR coefficients of a (M, N) array via a batched QR least-squares solve."""
+    M, N = x.shape
     if N <= order:
-        return [0.0] * order
-    Y = x[order:]
-    X = np.column_stack([x[order - k: N - k] for k in range(1, order + 1)])
-    coeffs, *_ = np.linalg.lstsq(X, Y, rcond=None)
-    return coeffs.flatten().tolist()
+        return np.zeros((M, order))
+    x = np.asarray(x, dtype=float)    # the fit is too ill-conditioned for float32
+    X = sliding_window_view(x[:, :-1], order, axis=1)[:, :, ::-1]
+    Y = x[:, order:]
+    # QR rather than normal equations: the smooth gravity signals are too
+    # ill-conditioned for X^T X to reproduce lstsq.
+    Q, R = np.linalg.qr(X)
+    QtY = np.einsum('mti,mt->mi', Q, Y)
+    # Rows that are rank-deficient at lstsq's default cutoff (e.g. a pure sine
+    # is exactly AR(2)) get lstsq's minimum-norm solution through pinv.
+    rcond = np.finfo(float).eps * max(N - order, order)
+    diag = np.abs(np.diagonal(R, axis1=1, axis2=2))
+    deficient = diag.min(axis=1) <= rcond * diag.max(axis=1)
+    coeffs = np.empty((M, order))
+    full = ~deficient
+    if full.any():
+        coeffs[full] = np.linalg.solve(R[full], QtY[full][..., None])[..., 0]
+    if deficient.any():
+        coeffs[deficient] = np.einsum('mit,mt->mi', np.linalg.pinv(X[deficient], rcond=rcond), Y[deficient])
+    return coeffs
+
+def time_domain_features_batch(sigs, stats=None, groups=None):
+    """Vectorized time_domain_features over the rows of a (M, N) array -> (M, 15).
+
+    `stats` optionally supplies per-row moment sums (see block_stats) computed
+    elsewhere, e.g. merged from the halves of overlapping windows. `groups`
+    limits the work to some FEATURE_GROUPS; the other columns are left zero.
+    """
+    groups = TIME_GROUPS if groups is None else groups
+    sigs = np.asarray(sigs)
+    if sigs.dtype.kind != 'f':
+        sigs = sigs.astype(float)
+    M = sigs.shape[0]
+    out = np.zeros((M, N_TIME_FEATURES), dtype=sigs.dtype)
+    if stats is None:
+        stats = _row_stats(sigs)
+    live = stats['max'] != stats['min']
+    if not live.any():
+        return out
+    x = sigs[live]
+    st = {k: v[live] for k, v in stats.items()}
+    n = st['n']
+    feats = np.zeros((len(x), N_TIME_FEATURES), dtype=sigs.dtype)
+    if 'moments' in groups:
+        sk, kt = _skew_kurtosis_from_stats(st)
+        feats[:, [0, 1, 3, 4, 5, 6, 13, 14]] = np.column_stack([
+            st['mean'],
+            np.sqrt(st['M2'] / n),
+            st['max'],
+            st['min'],
+            st['abs_sum'] / n,
+            st['sq_sum'] / (n + 1e-12),
+            sk,
+            kt,
+        ])
+    if 'robust' in groups:
+        med = np.median(x, axis=1)
+        q25, q75 = np.percentile(x, [25, 75], axis=1)
+        feats[:, 2] = np.median(np.abs(x - med[:, None]), axis=1)
+        feats[:, 7] = q75 - q25
+    if 'entropy' in groups:
+        feats[:, 8] = signal_entropy_batch(x)
+    if 'ar' in groups:
+        feats[:, 9:13] = ar_coeffs_batch(x, order=4)
+    out[live] = feats
+    return out
+
+def freq_domain_features_batch(sigs, fs=FS, taper=None, freqs=None, band_edges=None):
+    """Vectorized freq_domain_features over the rows of a (M, N) array -> (M, 12).
+
+    `taper`, `freqs` and `band_edges` may be passed in precomputed for N.
+    """
+    sigs = np.asarray(sigs)
+    if sigs.dtype.kind != 'f':
+        sigs = sigs.astype(float)
+    M, N = sigs.shape
+    out = np.zeros((M, N_FREQ_FEATURES), dtype=sigs.dtype)
+    if N == 0:
+        return out
+    if taper is None:
+        taper = hann_taper(N).astype(sigs.dtype, copy=False)
+    if freqs is None:
+        freqs = rfft_bins(N, fs).astype(sigs.dtype, copy=False)
+    from scipy.fft import rfft
+    psd = np.abs(rfft(sigs * taper, axis=1))**2
+    total = psd.sum(axis=1)
+    live = total != 0
+    if not live.any():
+        return out
+    psd = psd[live]
+    meanFreq = (freqs * psd).sum(axis=1) / (total[live] + 1e-12)
+    maxFreq = freqs[np.argmax(psd, axis=1)]
+    sk, kt = _skew_kurtosis_from_stats(_row_stats(psd))
+    if band_edges is None:
+        band_edges = spectral_band_edges(psd.shape[1])
+    bands = np.add.reduceat(psd, band_edges[:-1], axis=1)
+    out[live] = np.column_stack([meanFreq, maxFreq, sk, kt, bands])
+    return out
+
+def ar_coeffs_lstsq(x, order=4):
+    x = np.asarray(x, dtype=float).flatten()
+    return ar_coeffs_batch(x[None], order)[0].tolist()
 
 def signal_entropy(x, bins=30):
-    hist, _ = np.histogram(x, bins=bins, density=True)
-    hist = hist[hist > 0]
-    entropy = -np.sum(hist * np.log2(hist + 1e-12))
-    return entropy if np.isfinite(entropy) else 0.0
+    return float(signal_entropy_batch(np.asarray(x, dtype=float).reshape(1, -1), bins)[0])
 
 def time_domain_features(sig):
-    sig = np.asarray(sig, dtype=float)
-    if np.all(sig == sig[0]):
-        return [0.0] * 16
-    mean = sig.mean()
-    std = sig.std()
-    mad = np.median(np.abs(sig - np.median(sig)))
-    maxi = sig.max()
-    mini = sig.min()
-    sma = np.mean(np.abs(sig))
-    energy = np.sum(sig**2) / (sig.size + 1e-12)
-    iqr = np.percentile(sig, 75) - np.percentile(sig, 25)
-    ent = signal_entropy(sig)
-    ar = ar_coeffs_lstsq(sig, order=4)
-    sk = skew(sig, nan_policy='omit')
-    kt = kurtosis(sig, nan_policy='omit')
-    features = [mean, std, mad, maxi, mini, sma, energy, iqr, ent] + ar + [sk, kt]
-    return [0.0 if not np.isfinite(f) else f for f in features]
+    return time_domain_features_batch(np.asarray(sig, dtype=float).reshape(1, -1))[0].tolist()
 
 def freq_domain_features(sig, fs=50):
-    N = len(sig)
-    if N == 0:
-        return [0.0] * 12
-    fft_vals = rfft(sig * np.hanning(N))
-    psd = np.abs(fft_vals)**2
-    freqs = rfftfreq(N, 1/fs)
-    if psd.sum() == 0:
-        return [0.0] * 12
-    psd_sum = psd.sum() + 1e-12
-    meanFreq = (freqs * psd).sum() / psd_sum
-    maxFreq = freqs[np.argmax(psd)] if psd.max() > 0 else 0.0
-    sk = skew(psd, nan_policy='omit')
-    kt = kurtosis(psd, nan_policy='omit')
-    nbands = 8
-    band_edges = np.linspace(0, len(psd), nbands + 1, dtype=int)
-    bands = [psd[band_edges[i]:band_edges[i+1]].sum() for i in range(nbands)]
-    features = [meanFreq, maxFreq, sk, kt] + bands
-    return [0.0 if not np.isfinite(f) else f for f in features]
+    return freq_domain_features_batch(np.asarray(sig, dtype=float).reshape(1, -1), fs)[0].tolist()
+
+# (name, op, input) in feature-column order; 'source' nodes read the raw
+# acc/gyro channels, every other node is derived from an earlier one
+SIGNAL_GRAPH = (
+    ('tBodyAcc', 'source', 'acc'),
+    ('tGravityAcc', 'gravity', 'tBodyAcc'),
+    ('tBodyAccJerk', 'jerk', 'tBodyAcc'),
+    ('tBodyGyro', 'source', 'gyro'),
+    ('tBodyGyroJerk', 'jerk', 'tBodyGyro'),
+    ('tBodyAccMag', 'magnitude', 'tBodyAcc'),
+    ('tGravityAccMag', 'magnitude', 'tGravityAcc'),
+    ('tBodyAccJerkMag', 'magnitude', 'tBodyAccJerk'),
+    ('tBodyGyroMag', 'magnitude', 'tBodyGyro'),
+    ('tBodyGyroJerkMag', 'magnitude', 'tBodyGyroJerk'),
+)
+
+def signal_channels(nodes=SIGNAL_GRAPH):
+    """Channel count of the sources and of every node"""
+    channels = {'acc': 3, 'gyro': 3}
+    for name, op, src in nodes:
+        channels[name] = 1 if op == 'magnitude' else channels[src]
+    return channels
+
+def feature_names(nodes=SIGNAL_GRAPH):
+    """Name of every feature column, e.g. 'tBodyAcc-X:mean' or 'tBodyGyroMag:fBand2'"""
+    channels = signal_channels(nodes)
+    signals = [name if channels[name] == 1 else f"{name}-{axis}"
+               for name, _, _ in nodes for axis in 'XYZ'[:channels[name]]]
+    return [f"{sig}:{feat}" for sig in signals for feat in TIME_FEATURES + FREQ_FEATURES]
+
+FEATURE_NAMES = feature_names()
+
+class _Signal:
+    """Value of one graph node over a batch of windows.
+
+    A signal that does not depend on the window bounds is held once as a
+    continuous (channels, n_samples) `stream`, optionally with per-window
+    replacements for the first and last sample (`edges`, (n_windows,
+    channels, 2)). `windows` is the (n_windows, channels, window) stack,
+    built on demand.
+    """
+    __slots__ = ('stream', 'edges', 'windows')
+
+    def __init__(self, stream=None, edges=None, windows=None):
+        self.stream = stream
+        self.edges = edges
+        self.windows = windows
+
+    @property
+    def shared(self):
+        return self.stream is not None and self.edges is None
+
+class SignalGraph:
+    """Compiled feature pipeline: acc/gyro -> derived signals -> feature matrix.
+
+    Filter sections, the Hann taper, FFT bins and band edges come from the
+    DSP constants cache at construction, and every derived signal is
+    evaluated exactly once per batch, in node order.
+
+    With `columns` (indices into feature_names(nodes)) the graph returns only
+    those columns, in that order: nodes that feed none of them are never
+    evaluated, and each signal only runs the FEATURE_GROUPS its columns need.
+    """
+
+    def __init__(self, nodes=SIGNAL_GRAPH, fs=FS, window=WIN_S, gravity_cutoff=0.3, gravity_order=4,
+                 dtype=np.float64, columns=None):
+        self.nodes = tuple(nodes)
+        self.fs = fs
+        self.window = window
+        self.dtype = np.dtype(dtype)
+        self.gravity_sos = lowpass_sos(gravity_cutoff, fs, gravity_order)
+        # taper and bins in the working precision, so float32 batches are not promoted
+        self.taper = hann_taper(window).astype(self.dtype)
+        self.freqs = rfft_bins(window, fs).astype(self.dtype)
+        self.band_edges = spectral_band_edges(len(self.freqs))
+        self.channels = channels = signal_channels(self.nodes)
+        self.n_signals = sum(channels[name] for name, _, _ in self.nodes)
+        self.rows, start = {}, 0
+        for name, _, _ in self.nodes:
+            self.rows[name] = np.arange(start, start + channels[name])
+            start += channels[name]
+        per_signal = N_TIME_FEATURES + N_FREQ_FEATURES
+        n_all = self.n_signals * per_signal
+        if columns is None:
+            self.columns = None
+            self.needs = [None] * self.n_signals
+        else:
+            self.columns = np.asarray(columns, dtype=np.intp).reshape(-1)
+            if self.columns.size and (self.columns.min() < 0 or self.columns.max() >= n_all):
+                raise ValueError(f"Feature columns must lie in [0, {n_all})")
+            needs = [set() for _ in range(self.n_signals)]
+            for c in self.columns.tolist():
+                needs[c // per_signal].add(FEATURE_GROUPS[c % per_signal])
+            self.needs = [frozenset(n) for n in needs]
+        # nodes whose own features are needed, and those plus their inputs
+        self.featurized = [name for name, _, _ in self.nodes
+                           if any(self.needs[r] is None or self.needs[r] for r in self.rows[name])]
+        self.active = set(self.featurized)
+        for name, op, src in reversed(self.nodes):
+            if name in self.active and op != 'source':
+                self.active.add(src)
+        self.n_features = n_all if self.columns is None else len(self.columns)
+
+    def _windows(self, sig, n_windows, hop):
+        if sig.windows is None:
+            w = sliding_windows(sig.stream.T, self.window, hop)[:n_windows].transpose(0, 2, 1)
+            if sig.edges is not None:
+                w = w.copy()
+                w[:, :, 0] = sig.edges[..., 0]
+                w[:, :, -1] = sig.edges[..., 1]
+            sig.windows = w
+        return sig.windows
+
+    def _apply(self, op, sig, n_windows, hop):
+        if op == 'gravity':
+            from scipy.signal import sosfiltfilt
+            # always float64: gravity is nearly constant within a window and its
+            # AR fit is too ill-conditioned for a single-precision signal
+            windows = self._windows(sig, n_windows, hop).astype(float, copy=False)
+            return _Signal(windows=sosfiltfilt(self.gravity_sos, windows, axis=-1))
+        if op == 'jerk':
+            if sig.shared:
+                # np.gradient's interior stencil does not see the window
+                # bounds; only the one-sided first/last samples do
+                x = sig.stream
+                starts = np.arange(n_windows) * hop
+                first = (x[:, starts + 1] - x[:, starts]) * self.fs
+                last = (x[:, starts + self.window - 1] - x[:, starts + self.window - 2]) * self.fs
+                return _Signal(stream=np.gradient(x, axis=-1) * self.fs,
+                               edges=np.stack([first.T, last.T], axis=-1))
+            return _Signal(windows=np.gradient(self._windows(sig, n_windows, hop), axis=-1) * self.fs)
+        if op == 'magnitude':
+            if sig.stream is not None:
+                edges = None if sig.edges is None else np.sqrt(np.sum(sig.edges**2, axis=1, keepdims=True))
+                return _Signal(stream=np.sqrt(np.sum(sig.stream**2, axis=0, keepdims=True)), edges=edges)
+            return _Signal(windows=np.sqrt(np.sum(sig.windows**2, axis=1, keepdims=True)))
+        raise ValueError(f"Unknown signal op: {op}")
+
+    def _evaluate(self, sources, n_windows, hop=None):
+        values = {}
+        for name, op, src in self.nodes:
+            if name in self.active:
+                values[name] = sources[src] if op == 'source' else self._apply(op, values[src], n_windows, hop)
+        return values
+
+    def _stack(self, values, names, n_windows, hop=None):
+        signals = np.concatenate([self._windows(values[name], n_windows, hop) for name in names], axis=1)
+        stats = None
+        if hop is not None and self.window % hop == 0:
+            # moments of stream signals: accumulate per hop-sized block once,
+            # then merge the blocks making up each window
+            parts = []
+            for name in names:
+                sig = values[name]
+                if sig.shared:
+                    st = window_stats(block_stats(sig.stream, hop), self.window // hop)
+                    parts.append({k: v.T for k, v in st.items()})
+                else:
+                    parts.append(_row_stats(sig.windows))
+            stats = {k: np.concatenate([p[k] for p in parts], axis=1) for k in parts[0]}
+        return signals, stats
+
+    def _features(self, sources, n_windows, hop=None):
+        """Feature matrix of the graph's signals.
+
+        Signals of each precision are featurized together, and within those,
+        signals needing the same feature groups.
+        """
+        values = self._evaluate(sources, n_windows, hop)
+        per_signal = N_TIME_FEATURES + N_FREQ_FEATURES
+        out = np.zeros((n_windows, self.n_signals, per_signal), dtype=self.dtype)
+        by_dtype = {}
+        for name in self.featurized:
+            sig = values[name]
+            by_dtype.setdefault((sig.stream if sig.stream is not None else sig.windows).dtype, []).append(name)
+        for names in by_dtype.values():
+            signals, stats = self._stack(values, names, n_windows, hop)
+            rows = np.concatenate([self.rows[name] for name in names])
+            by_needs = {}
+            for i, row in enumerate(rows.tolist()):
+                if self.needs[row] is None or self.needs[row]:
+                    by_needs.setdefault(self.needs[row], []).append(i)
+            for groups, local in by_needs.items():
+                if len(local) < len(rows):
+                    sub = signals[:, local], None if stats is None else {k: v[:, local] for k, v in stats.items()}
+                else:
+                    sub = signals, stats
+                feats = self.features_from_signals(*sub, groups=groups)
+                out[:, rows[local]] = feats.reshape(n_windows, -1, per_signal)
+        out = out.reshape(n_windows, -1)
+        return out if self.columns is None else out[:, self.columns]
+
+    def features_from_signals(self, signals, stats=None, groups=None):
+        """(n_windows, n_signals, window) signal stack -> (n_windows, n_features) feature matrix
+
+        `groups` limits the work to some FEATURE_GROUPS; the other columns are left zero.
+        """
+        n_windows, n_signals, N = signals.shape
+        flat = signals.reshape(-1, N)
+        if stats is not None:
+            stats = {k: v.reshape(-1) for k, v in stats.items()}
+        time_feats = time_domain_features_batch(flat, stats, groups)
+        if groups is None or 'spectrum' in groups:
+            freq_feats = freq_domain_features_batch(flat, self.fs, self.taper, self.freqs, self.band_edges)
+        else:
+            freq_feats = np.zeros((len(flat), N_FREQ_FEATURES), dtype=time_feats.dtype)
+        feats = np.concatenate([time_feats, freq_feats], axis=1)
+        feats = feats.reshape(n_windows, n_signals * feats.shape[1])
+        feats[~np.isfinite(feats)] = 0.0
+        return feats
+
+    def windows_features(self, total_acc_windows, gyro_windows):
+        """Features of (n_windows, window, 3) acc/gyro stacks"""
+        acc = np.asarray(total_acc_windows, dtype=self.dtype).transpose(0, 2, 1)
+        gyro = np.asarray(gyro_windows, dtype=self.dtype).transpose(0, 2, 1)
+        n_windows = len(acc)
+        if n_windows == 0:
+            return np.zeros((0, self.n_features), dtype=self.dtype)
+        sources = {'acc': _Signal(windows=acc), 'gyro': _Signal(windows=gyro)}
+        return self._features(sources, n_windows)
+
+    def sliding_features(self, total_acc, gyro, hop):
+        """Features of every window, `hop` samples apart, of continuous (n_samples, 3) acc/gyro arrays"""
+        acc = np.asarray(total_acc, dtype=self.dtype)
+        gyro = np.asarray(gyro, dtype=self.dtype)
+        n_windows = window_count(len(acc), self.window, hop)
+        if n_windows <= 0:
+            return np.zeros((0, self.n_features), dtype=self.dtype)
+        span = (n_windows - 1) * hop + self.window
+        sources = {
+            'acc': _Signal(stream=np.ascontiguousarray(acc[:span].T)),
+            'gyro': _Signal(stream=np.ascontiguousarray(gyro[:span].T)),
+        }
+        return self._features(sources, n_windows, hop)
+
+def get_signal_graph(window=WIN_S, fs=FS, dtype=None, columns=None):
+    """Shared SignalGraph for a window length, sampling rate, precision (default FEATURE_DTYPE) and column subset"""
+    columns = None if columns is None else tuple(int(c) for c in columns)
+    return _signal_graph(window, fs, np.dtype(dtype or FEATURE_DTYPE), columns)
+
+@lru_cache(maxsize=8)
+def _signal_graph(window, fs, dtype, columns):
+    return SignalGraph(fs=fs, window=window, dtype=dtype, columns=columns)
 
 def features_from_window(signals_dict):
-    fv = []
-    tri_signals = ['tBodyAcc','tGravityAcc','tBodyAccJerk','tBodyGyro','tBodyGyroJerk']
-    for name in tri_signals:
-        X = signals_dict[name]
-        for ax in range(3):
-            s = X[:, ax]
-            fv += time_domain_features(s)
-            fv += freq_domain_features(s)
-    mag_signals = ['tBodyAccMag','tGravityAccMag','tBodyAccJerkMag','tBodyGyroMag','tBodyGyroJerkMag']
-    for m in mag_signals:
-        s = signals_dict[m]
-        fv += time_domain_features(s)
-        fv += freq_domain_features(s)
-    fv_array = np.array(fv)
-    if np.any(~np.isfinite(fv_array)):
-        fv_array[~np.isfinite(fv_array)] = 0.0
-    return fv_array
+    graph = get_signal_graph(len(signals_dict['tBodyAcc']))
+    stack = np.concatenate([np.asarray(signals_dict[name], dtype=graph.dtype).reshape(graph.window, -1).T
+                            for name, _, _ in graph.nodes])
+    return graph.features_from_signals(stack[None])[0]
 
 def process_single_window(tAcc_window, gyro_window):
-    tAccJerk = compute_jerk(tAcc_window)
-    gyroJerk = compute_jerk(gyro_window)
-    tAccMag = magnitude(tAcc_window)
-    gravityMag = magnitude(compute_gravity(tAcc_window))
-    tAccJerkMag = magnitude(tAccJerk)
-    gyroMag = magnitude(gyro_window)
-    gyroJerkMag = magnitude(gyroJerk)
-    signals_win = {
-        'tBodyAcc': tAcc_window,
-        'tGravityAcc': compute_gravity(tAcc_window),
-        'tBodyAccJerk': tAccJerk,
-        'tBodyGyro': gyro_window,
-        'tBodyGyroJerk': gyroJerk,
-        'tBodyAccMag': tAccMag,
-        'tGravityAccMag': gravityMag,
-        'tBodyAccJerkMag': tAccJerkMag,
-        'tBodyGyroMag': gyroMag,
-        'tBodyGyroJerkMag': gyroJerkMag
-    }
-    return features_from_window(signals_win)
+    """Process a single window of data (128 time steps, 3 axes)"""
+    return process_windows_batch(np.asarray(tAcc_window)[None], np.asarray(gyro_window)[None])[0]
+
+def process_windows_batch(total_acc_windows, gyro_windows, dtype=None, columns=None):
+    """Feature matrix for (n_windows, 128, 3) acc/gyro stacks (only `columns`, if given)"""
+    total_acc_windows = np.asarray(total_acc_windows)
+    graph = get_signal_graph(total_acc_windows.shape[1], dtype=dtype, columns=columns)
+    return graph.windows_features(total_acc_windows, gyro_windows)
+
+def process_sliding_windows(total_acc, gyro, window=WIN_S, hop=WIN_S // 2, dtype=None, columns=None):
+    """Features of every `window`-sample window, `hop` apart, of a continuous recording.
+
+    Equivalent to windowing the (n_samples, 3) acc/gyro arrays and calling
+    process_windows_batch, but work that overlapping windows share is done
+    once per sample: jerk and magnitude signals are derived on the whole
+    recording, and moment statistics of the raw channels are accumulated per
+    hop-sized block and merged. Gravity filtering, medians/percentiles,
+    histogram entropy, AR fits and the tapered FFT depend on the window
+    bounds and are still computed per window. dtype selects the working
+    precision (FEATURE_DTYPE by default); columns restricts the output to
+    those feature columns and skips the work only the others need.
+    """
+    return get_signal_graph(window, dtype=dtype, columns=columns).sliding_features(total_acc, gyro, hop)
 
 def process_all_pre_segmented_windows(total_acc_windows, gyro_windows):
-    n_windows = total_acc_windows.shape[0]
-    all_features = []
-    for i in range(n_windows):
-        tAcc_window = total_acc_windows[i]
-        gyro_window = gyro_windows[i]
-        features = process_single_window(tAcc_window, gyro_window)
-        all_features.append(features)
-    return np.array(all_features)
+    return process_windows_batch(total_acc_windows, gyro_windows)
 
 def load_and_preprocess_sensor_file(file_path, expected_columns=6):
+    import pandas as pd
     try:
         if file_path.endswith('.txt'):
             df = pd.read_csv(file_path, sep='\s+', header=None)
@@ -142,20 +595,11 @@ def load_and_preprocess_sensor_file(file_path, expected_columns=6):
         if df.shape[1] < expected_columns:
             raise ValueError(f"Expected at least {expected_columns} columns, got {df.shape[1]}")
         
-        acc_data = df.iloc[:, :3].values
-        gyro_data = df.iloc[:, 3:6].values
-        
-        window_size = 128
-        acc_windows = []
-        gyro_windows = []
+        data = df.iloc[:, :6].to_numpy(dtype=FEATURE_DTYPE)
         
-        for start_idx in range(0, len(acc_data) - window_size + 1, window_size):
-            acc_window = acc_data[start_idx:start_idx + window_size]
-            gyro_window = gyro_data[start_idx:start_idx + window_size]
-            acc_windows.append(acc_window)
-            gyro_windows.append(gyro_window)
-        
-        return np.array(acc_windows), np.array(gyro_windows)
+        # non-overlapping windows, as views of the recording
+        windows = sliding_windows(data, WIN_S, WIN_S)
+        return windows[:, :, :3], windows[:, :, 3:6]
         
     except Exception as e:
         print(f"Error loading file: {e}")
@@ -173,9 +617,26 @@ class HARPredictor:
         if acc_windows is None or gyro_windows is None:
             return ["Error processing file"]
         return self.predict(acc_windows, gyro_windows)
-    
-    def predict(self, total_acc_windows, gyro_windows):
-        features = process_all_pre_segmented_windows(total_acc_windows, gyro_windows)
+
+    def predict_from_files(self, file_paths):
+        """Per-file predictions, with every file's windows classified in one call"""
+        loaded = [load_and_preprocess_sensor_file(path) for path in file_paths]
+        ok = [(acc, gyro) for acc, gyro in loaded if acc is not None and gyro is not None and len(acc)]
+        preds = self.predict(np.concatenate([a for a, _ in ok]), np.concatenate([g for _, g in ok])) if ok else []
+        results, start = [], 0
+        for acc, gyro in loaded:
+            if acc is None or gyro is None:
+                results.append(["Error processing file"])
+                continue
+            results.append(preds[start:start + len(acc)])
+            start += len(acc)
+        return results
+
+    def predict(self, total_acc_windows, gyro_windows, executor=None):
+        if executor is None:
+            from har_executor import get_default_executor
+            executor = get_default_executor()
+        features = executor.windows_features(total_acc_windows, gyro_windows)
         features = np.nan_to_num(features, nan=0.0)
         features_scaled = self.scaler.transform(features)
         preds = self.model.predict(features_scaled)
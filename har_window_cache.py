@@ -0,0 +1,157 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from hashlib import blake2b
+
+import numpy as np
+
+from har_metrics import metrics
+from har_utils import FEATURE_DTYPE, FEATURE_PIPELINE_VERSION, FS, N_FEATURES, sliding_windows, window_count
+
+# Feature rows are N_FEATURES float64 (~4.3 KB); 0 entries disables the cache
+WINDOW_CACHE_ENTRIES = int(os.environ.get("HAR_WINDOW_CACHE_ENTRIES", "8192"))
+WINDOW_CACHE_DB = os.environ.get("HAR_WINDOW_CACHE_DB") or None   # sqlite file shared by workers
+SQLITE_BATCH = 500   # bound on ? parameters per SELECT
+
+
+class WindowFeatureCache:
+    """Feature rows keyed by a hash of the raw window samples.
+
+    Keys are 16-byte blake2b digests of the (window, channels) sample block,
+    keyed by the feature pipeline version, window length, sampling rate,
+    working precision and feature column subset so rows from another
+    configuration never match. An in-process LRU sits in front of an optional
+    sqlite store that several workers can share.
+    """
+
+    def __init__(self, max_entries=WINDOW_CACHE_ENTRIES, db_path=WINDOW_CACHE_DB, fs=FS):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.fs = fs
+        self._lock = threading.Lock()
+        self._rows = OrderedDict()
+        self._db = None
+        self._db_pid = None
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _namespace(self, window, columns=None):
+        ns = f"{FEATURE_PIPELINE_VERSION}:{window}:{self.fs}:{FEATURE_DTYPE.name}"
+        if columns is not None:
+            ns += ":" + blake2b(np.asarray(columns, dtype=np.int64).tobytes(), digest_size=8).hexdigest()
+        return ns.encode()
+
+    def keys(self, data, window, hop, n_windows, columns=None):
+        """Digest of each window of a C-contiguous (n_samples, channels) FEATURE_DTYPE array"""
+        ns = self._namespace(window, columns)
+        return [blake2b(data[i * hop:i * hop + window], digest_size=16, key=ns).digest() for i in range(n_windows)]
+
+    def _connection(self):
+        # one connection per process: sqlite handles must not cross a fork
+        if self._db is None or self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS features (key BLOB PRIMARY KEY, value BLOB)")
+            self._db_pid = os.getpid()
+        return self._db
+
+    def _db_get(self, keys, n_features):
+        found = {}
+        with self._lock:
+            db = self._connection()
+            for s in range(0, len(keys), SQLITE_BATCH):
+                batch = keys[s:s + SQLITE_BATCH]
+                rows = db.execute(f"SELECT key, value FROM features WHERE key IN ({','.join('?' * len(batch))})", batch)
+                found.update(rows)
+        return {k: np.frombuffer(v, dtype=float) for k, v in found.items() if len(v) == n_features * 8}
+
+    def _db_put(self, keys, features):
+        with self._lock:
+            db = self._connection()
+            with db:
+                db.executemany("INSERT OR IGNORE INTO features VALUES (?, ?)",
+                               [(k, row.tobytes()) for k, row in zip(keys, features)])
+
+    def _remember(self, keys, features):
+        with self._lock:
+            for k, row in zip(keys, features):
+                self._rows[k] = row.copy()   # own memory, so one row never pins a whole batch
+                self._rows.move_to_end(k)
+            while len(self._rows) > self.max_entries:
+                self._rows.popitem(last=False)
+
+    def lookup(self, keys, n_features=N_FEATURES):
+        """(n, n_features) rows for the keys found and a boolean mask of which were found"""
+        out = np.empty((len(keys), n_features))
+        found = np.zeros(len(keys), dtype=bool)
+        with self._lock:
+            for i, k in enumerate(keys):
+                row = self._rows.get(k)
+                if row is not None:
+                    self._rows.move_to_end(k)
+                    out[i] = row
+                    found[i] = True
+        memory_hits = int(found.sum())
+        disk_hits = 0
+        if self.db_path and not found.all():
+            missing = [keys[i] for i in np.flatnonzero(~found)]
+            rows = self._db_get(missing, n_features)
+            if rows:
+                idx = [i for i in np.flatnonzero(~found) if keys[i] in rows]
+                out[idx] = [rows[keys[i]] for i in idx]
+                found[idx] = True
+                self._remember([keys[i] for i in idx], out[idx])
+                disk_hits = len(idx)
+        metrics.inc("har_window_cache_total", memory_hits, tier="memory", outcome="hit")
+        metrics.inc("har_window_cache_total", disk_hits, tier="disk", outcome="hit")
+        metrics.inc("har_window_cache_total", len(keys) - memory_hits - disk_hits, tier="all", outcome="miss")
+        return out, found
+
+    def store(self, keys, features):
+        features = np.asarray(features, dtype=float)
+        self._remember(keys, features)
+        if self.db_path:
+            self._db_put(keys, features)
+
+    def sliding_features(self, data, window, hop, sliding_fn, windows_fn, columns=None):
+        """Features of every window of data, computing only the windows not cached.
+
+        sliding_fn(data) featurizes all windows with overlap sharing and is used
+        when nothing is cached; windows_fn(acc_windows, gyro_windows) featurizes
+        the uncached windows otherwise. Both must return the feature `columns`
+        (all of them when None).
+        """
+        data = np.ascontiguousarray(data, dtype=FEATURE_DTYPE)
+        n_windows = window_count(len(data), window, hop)
+        if n_windows == 0:
+            return sliding_fn(data)
+        keys = self.keys(data, window, hop, n_windows, columns)
+        features, found = self.lookup(keys, N_FEATURES if columns is None else len(columns))
+        if not found.any():
+            features = sliding_fn(data)
+            self.store(keys, features)
+            return features
+        missing = np.flatnonzero(~found)
+        if len(missing):
+            windows = sliding_windows(data, window, hop)[missing]   # copies only the missing windows
+            features[missing] = windows_fn(windows[:, :, :3], windows[:, :, 3:6])
+            self.store([keys[i] for i in missing], features[missing])
+        return features
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+
+_window_cache = None
+
+
+def get_window_cache():
+    """Process-wide cache configured from HAR_WINDOW_CACHE_ENTRIES / HAR_WINDOW_CACHE_DB"""
+    global _window_cache
+    if _window_cache is None:
+        _window_cache = WindowFeatureCache()
+    return _window_cache
@@ -0,0 +1,366 @@
+"""
+Load Test for the HAR API
+Simulates a fleet of devices against a running server (or one started here with
+uvicorn): upload devices POST synthetic recordings to /api/predict at Poisson
+arrival times, streaming devices push samples to /api/stream in real time.
+Reports throughput, latency percentiles, error and rejection rates, and the
+server's CPU, RSS and inference queue over time.
+
+    python loadtest.py --devices 20 --rate 0.5 --duration 30
+    python loadtest.py --workers 2 --streams 10 --server-env HAR_BATCHING=0 --output run.json
+    python loadtest.py --url http://localhost:8030 --pid 12345 --max-error-rate 0.01
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from benchmark import FORMATS, GENERATORS, encode_recording, generate_recording, parse_mix
+from har_utils import FS
+
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+LATENCY_PERCENTILES = (50, 90, 99)
+# Devices resend a few recordings, so the local server runs without its caches
+# (measuring the pipeline, not cache hits) unless --server-env turns them back on
+LOCAL_SERVER_ENV = {"HAR_RESULT_CACHE": "0", "HAR_WINDOW_CACHE_ENTRIES": "0"}
+
+
+def device_payloads(n_devices, samples, mix, fmt, seed, variants=4):
+    """Encoded uploads per device: each device has its own activity mix and a few recordings"""
+    rng = np.random.default_rng(seed)
+    names = list(mix)
+    weights = np.array([mix[n] for n in names]) / sum(mix.values())
+    payloads = []
+    for d in range(n_devices):
+        device = []
+        for v in range(variants):
+            activity = names[rng.choice(len(names), p=weights)]
+            device.append(encode_recording(generate_recording(samples, {activity: 1}, seed + d * variants + v), fmt))
+        payloads.append(device)
+    return payloads
+
+
+def percentiles(values):
+    if not values:
+        return {**{f"p{p}_ms": None for p in LATENCY_PERCENTILES}, "max_ms": None}
+    ms = np.asarray(values) * 1e3
+    return {**{f"p{p}_ms": float(np.percentile(ms, p)) for p in LATENCY_PERCENTILES}, "max_ms": float(ms.max())}
+
+
+def status_class(status):
+    if status == 200:
+        return "ok"
+    return "rejected" if status in (429, 503) else "error"
+
+
+# ---------- server process ----------
+
+def process_tree(pid):
+    """pid and all its descendants, from the parent ids in /proc/*/stat"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    tree, todo = [], [pid]
+    while todo:
+        p = todo.pop()
+        tree.append(p)
+        todo.extend(children.get(p, []))
+    return tree
+
+
+def process_usage(pid):
+    """(cpu seconds, rss bytes) summed over a process tree; (None, None) without /proc"""
+    cpu = rss = 0
+    try:
+        pids = process_tree(pid)
+    except OSError:
+        return None, None
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{p}/statm") as f:
+                rss += int(f.read().split()[1]) * PAGE_SIZE
+            cpu += (int(fields[11]) + int(fields[12])) / CLK_TCK   # utime + stime
+        except (OSError, IndexError, ValueError):
+            continue
+    return cpu, rss
+
+
+def start_server(port, workers, env):
+    """uvicorn api:app on 127.0.0.1:port as a subprocess"""
+    cmd = [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(port),
+           "--workers", str(workers), "--log-level", "warning"]
+    return subprocess.Popen(cmd, env={**os.environ, **env}, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+async def wait_ready(client, url, timeout):
+    """Poll /api/health until the warm-up has finished"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(f"{url}/api/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError(f"Server at {url} not ready after {timeout}s")
+
+
+# ---------- devices ----------
+
+class Recorder:
+    """Outcomes of every request, bucketed later by completion time"""
+
+    def __init__(self):
+        self.uploads = []   # (finished, latency, status)
+        self.streams = []   # (finished, latency)
+        self.stream_errors = 0
+
+
+async def upload_device(client, url, payloads, filename, rate, stop_at, include, recorder, rng):
+    """Open-loop Poisson uploads: requests are fired on schedule whether or not earlier ones finished"""
+    tasks = []
+
+    async def one(body):
+        start = time.perf_counter()
+        try:
+            r = await client.post(f"{url}/api/predict", params=include, files={"file": (filename, body)})
+            status = r.status_code
+        except Exception:
+            status = 0
+        recorder.uploads.append((time.perf_counter(), time.perf_counter() - start, status))
+
+    i = 0
+    while True:
+        await asyncio.sleep(rng.exponential(1 / rate))
+        if time.perf_counter() >= stop_at:
+            break
+        tasks.append(asyncio.create_task(one(payloads[i % len(payloads)])))
+        i += 1
+    await asyncio.gather(*tasks)
+
+
+async def stream_device(ws_url, data, chunk, speed, stop_at, recorder):
+    """Send `chunk` samples at a time at FS * speed Hz; latency is send-to-prediction of the completing chunk"""
+    import websockets
+    sent = {}   # samples_received after a chunk -> time it was sent
+    try:
+        async with websockets.connect(f"{ws_url}/api/stream", max_size=None) as ws:
+            async def receive():
+                async for message in ws:
+                    msg = json.loads(message)
+                    if "error" in msg:
+                        recorder.stream_errors += 1
+                        continue
+                    t = sent.get(msg["samples_received"])
+                    if t is not None:
+                        recorder.streams.append((time.perf_counter(), time.perf_counter() - t))
+
+            receiver = asyncio.create_task(receive())
+            total, i = 0, 0
+            while time.perf_counter() < stop_at:
+                frame = data[i:i + chunk]
+                i = (i + chunk) % (len(data) - chunk)
+                total += len(frame)
+                sent[total] = time.perf_counter()
+                await ws.send(np.ascontiguousarray(frame, dtype="<f4").tobytes())
+                await asyncio.sleep(chunk / FS / speed)
+            await asyncio.sleep(0.5)   # let the last predictions arrive
+            receiver.cancel()
+    except Exception:
+        recorder.stream_errors += 1
+
+
+async def monitor(client, url, pid, interval, stop_at, samples):
+    """Sample server CPU %, RSS and inference queue every `interval` seconds"""
+    cpu0, _ = process_usage(pid) if pid else (None, None)
+    t0 = time.perf_counter()
+    while time.perf_counter() < stop_at:
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        cpu, rss = process_usage(pid) if pid else (None, None)
+        queue = {}
+        try:
+            queue = (await client.get(f"{url}/api/health")).json().get("queue") or {}
+        except Exception:
+            pass
+        samples.append({
+            "begin": t0,
+            "t": now,
+            "cpu_percent": None if cpu is None or cpu0 is None else 100 * (cpu - cpu0) / (now - t0),
+            "rss_mb": None if rss is None else rss / 2**20,
+            "queue_windows": queue.get("queue_windows"),
+            "inflight": queue.get("inflight"),
+        })
+        cpu0, t0 = cpu, now
+
+
+# ---------- report ----------
+
+def summarize(recorder, samples, started, duration):
+    uploads = recorder.uploads
+    classes = [status_class(s) for _, _, s in uploads]
+    ok_latency = [lat for (_, lat, _), c in zip(uploads, classes) if c == "ok"]
+    cpu = [s["cpu_percent"] for s in samples if s["cpu_percent"] is not None]
+    rss = [s["rss_mb"] for s in samples if s["rss_mb"] is not None]
+    return {
+        "uploads": {
+            "requests": len(uploads),
+            "throughput_per_s": classes.count("ok") / duration,
+            "error_rate": classes.count("error") / len(uploads) if uploads else 0.0,
+            "rejected_rate": classes.count("rejected") / len(uploads) if uploads else 0.0,
+            **percentiles(ok_latency),
+        },
+        "streams": {
+            "predictions": len(recorder.streams),
+            "predictions_per_s": len(recorder.streams) / duration,
+            "errors": recorder.stream_errors,
+            **percentiles([lat for _, lat in recorder.streams]),
+        },
+        "server": {
+            "cpu_percent_mean": float(np.mean(cpu)) if cpu else None,
+            "cpu_percent_peak": float(np.max(cpu)) if cpu else None,
+            "rss_mb_peak": float(np.max(rss)) if rss else None,
+        },
+        "timeline": [timeline_row(recorder, s, started) for s in samples],
+    }
+
+
+def timeline_row(recorder, sample, started):
+    """Uploads finished since the previous sample, with the sample's server stats"""
+    done = [(lat, s) for t, lat, s in recorder.uploads if sample["begin"] < t <= sample["t"]]
+    ok = [lat for lat, s in done if s == 200]
+    return {
+        "t_s": sample["t"] - started,
+        "completed": len(done),
+        "ok": len(ok),
+        "p50_ms": float(np.percentile(ok, 50) * 1e3) if ok else None,
+        "p99_ms": float(np.percentile(ok, 99) * 1e3) if ok else None,
+        "failed": len(done) - len(ok),
+        **{k: sample[k] for k in ("cpu_percent", "rss_mb", "queue_windows", "inflight")},
+    }
+
+
+def fmt(value, spec):
+    return "-" if value is None else format(value, spec)
+
+
+async def run(args):
+    import httpx
+
+    server = None
+    url = args.url
+    pid = args.pid
+    if url is None:
+        env = {**LOCAL_SERVER_ENV, **dict(kv.split("=", 1) for kv in args.server_env)}
+        server = start_server(args.port, args.workers, env)
+        url, pid = f"http://127.0.0.1:{args.port}", server.pid
+    ws_url = "ws" + url[len("http"):]
+    include = {"include": args.include}
+
+    mix = parse_mix(args.mix)
+    payloads = device_payloads(args.devices, args.samples, mix, args.format, args.seed)
+    stream_data = [generate_recording(max(args.samples, 4 * args.chunk), mix, args.seed + 1000 + d)
+                   for d in range(args.streams)]
+    recorder, samples = Recorder(), []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    try:
+        async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+            await wait_ready(client, url, args.startup_timeout)
+            print(f"Load: {args.devices} upload devices at {args.rate}/s each ({args.samples} samples, "
+                  f"{args.format}), {args.streams} streams at {args.speed}x real time, {args.duration}s -> {url}")
+            print(f"{'t s':>6}{'done':>7}{'ok':>6}{'fail':>6}{'p50 ms':>9}{'p99 ms':>9}{'cpu %':>8}{'rss MB':>8}{'queue':>7}")
+            started = time.perf_counter()
+            stop_at = started + args.duration
+            rng = np.random.default_rng(args.seed)
+            tasks = [upload_device(client, url, payloads[d], f"device{d}.{args.format}", args.rate, stop_at,
+                                   include, recorder, np.random.default_rng(rng.integers(1 << 32)))
+                     for d in range(args.devices) if args.rate > 0]
+            tasks += [stream_device(ws_url, stream_data[d], args.chunk, args.speed, stop_at, recorder)
+                      for d in range(args.streams)]
+
+            async def report():
+                printed = 0
+                while time.perf_counter() < stop_at + args.interval:
+                    await asyncio.sleep(args.interval / 2)
+                    while printed < len(samples):
+                        row = timeline_row(recorder, samples[printed], started)
+                        print(f"{row['t_s']:>6.1f}{row['completed']:>7}{row['ok']:>6}{row['failed']:>6}"
+                              f"{fmt(row['p50_ms'], '.0f'):>9}{fmt(row['p99_ms'], '.0f'):>9}"
+                              f"{fmt(row['cpu_percent'], '.0f'):>8}{fmt(row['rss_mb'], '.0f'):>8}"
+                              f"{fmt(row['queue_windows'], 'd'):>7}")
+                        printed += 1
+
+            await asyncio.gather(monitor(client, url, pid, args.interval, stop_at, samples), report(), *tasks)
+            elapsed = time.perf_counter() - started
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+    return summarize(recorder, samples, started, elapsed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate a fleet of devices against the HAR API")
+    parser.add_argument("--url", help="server to load (default: start uvicorn api:app locally)")
+    parser.add_argument("--pid", type=int, help="server pid to monitor when --url is given")
+    parser.add_argument("--port", type=int, default=8040, help="port for the local server")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the local server")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="environment for the local server (repeatable)")
+    parser.add_argument("--devices", type=int, default=10, help="upload devices")
+    parser.add_argument("--rate", type=float, default=0.5, help="uploads per second per device (Poisson)")
+    parser.add_argument("--samples", type=int, default=3000, help=f"samples per upload ({FS} Hz)")
+    parser.add_argument("--mix", default="walking:1,sitting:1,standing:1",
+                        help=f"activity:weight list over {', '.join(GENERATORS)}")
+    parser.add_argument("--format", choices=FORMATS, default="npy", help="upload format")
+    parser.add_argument("--include", default="", help="include= sections requested (default: summary only)")
+    parser.add_argument("--streams", type=int, default=0, help="streaming devices on /api/stream")
+    parser.add_argument("--chunk", type=int, default=25, help="samples per stream frame")
+    parser.add_argument("--speed", type=float, default=1.0, help="stream rate as a multiple of real time")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between timeline rows")
+    parser.add_argument("--timeout", type=float, default=60, help="per-request timeout in seconds")
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--max-error-rate", type=float, help="fail if more uploads than this fraction error")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args))
+    u, s, srv = result["uploads"], result["streams"], result["server"]
+    print("=" * 78)
+    print(f"Uploads: {u['requests']} sent, {u['throughput_per_s']:.2f}/s ok, "
+          f"{u['error_rate']:.2%} errors, {u['rejected_rate']:.2%} rejected (429/503)")
+    print("  latency " + "  ".join(f"{k[:-3]} {fmt(v, '.0f')} ms" for k, v in u.items() if k.endswith("_ms")))
+    if args.streams:
+        print(f"Streams: {s['predictions']} predictions, {s['predictions_per_s']:.1f}/s, {s['errors']} errors")
+        print("  latency " + "  ".join(f"{k[:-3]} {fmt(v, '.0f')} ms" for k, v in s.items() if k.endswith("_ms")))
+    print(f"Server: cpu mean {fmt(srv['cpu_percent_mean'], '.0f')}% peak {fmt(srv['cpu_percent_peak'], '.0f')}%, "
+          f"rss peak {fmt(srv['rss_mb_peak'], '.0f')} MB")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), **result}, f, indent=2)
+        print(f"✓ Saved report: {args.output}")
+    if args.max_error_rate is not None and u["error_rate"] > args.max_error_rate:
+        print(f"✗ Error rate above {args.max_error_rate:.2%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
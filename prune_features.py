@@ -0,0 +1,149 @@
+"""
+Feature Pruning for the Linear SVM
+Ranks feature columns by their contribution to the (standardized) SVM decision
+values on a calibration recording, or by weight alone, builds predictors that
+read only the top fraction of columns, and reports per-window
+feature time, skipped signals, agreement with the full model and accuracy on
+labelled synthetic recordings. Dropped columns are held at their training mean,
+which the pruned predictor folds into its intercept.
+
+    python prune_features.py
+    python prune_features.py recordings/*.csv --keep 1,0.5,0.25
+    python prune_features.py --save 0.5 --output har_model_artifact_pruned
+"""
+
+import argparse
+import sys
+import time
+
+import joblib
+import numpy as np
+
+from benchmark import GENERATORS, generate_recording
+from har_io import parse_file_content
+from har_model import compile_predictor, prune_predictor, save_artifact
+from har_utils import FEATURE_DTYPE, WIN_S, get_signal_graph, process_sliding_windows
+
+HOP = WIN_S // 2
+CALIBRATION_SEED = 1000   # kept apart from the evaluation seeds
+# Activity each synthetic generator produces
+GENERATOR_LABELS = {'walking': 'WALKING', 'sitting': 'SITTING', 'standing': 'STANDING'}
+
+
+def rank_columns(predictor, calibration=None):
+    """Feature columns, most important first.
+
+    Importance is the max over class pairs of |weight| in standardized space,
+    times the mean |standardized value| of the column on the calibration
+    features when given, so columns that barely move the decision on real
+    data rank low even if their weight is large.
+    """
+    weights = np.abs(predictor.model.coef_)
+    if calibration is not None:
+        z = np.abs(predictor.scaler.transform(calibration)).mean(axis=0)
+        weights = weights * z
+    return np.argsort(-weights.max(axis=0), kind='stable')
+
+
+def build_variants(predictor, fractions, calibration=None):
+    """[(fraction, CompiledPredictor)] reading the top `fraction` of the ranked columns"""
+    full = compile_predictor(predictor)
+    order = rank_columns(predictor, calibration)
+    variants = []
+    for fraction in fractions:
+        if fraction >= 1:
+            variants.append((1.0, full))
+            continue
+        keep = np.sort(order[:max(1, int(round(fraction * len(order))))])
+        variants.append((fraction, prune_predictor(full, keep, predictor.scaler.mean_)))
+    return variants
+
+
+def featurize(data, columns, repeat=3):
+    """(features, best seconds) of the sliding-window pipeline for a column subset"""
+    data = np.asarray(data[:, :6], dtype=FEATURE_DTYPE)
+    best, features = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        features = process_sliding_windows(data[:, :3], data[:, 3:6], WIN_S, HOP, columns=columns)
+        best = min(best, time.perf_counter() - start)
+    return np.nan_to_num(features, nan=0.0), best
+
+
+def datasets(files, samples, seeds):
+    """(name, recording, label or None): one per synthetic activity and seed, then the given files"""
+    for seed in range(seeds):
+        for activity in GENERATORS:
+            yield f"{activity} (seed {seed})", generate_recording(samples, {activity: 1}, seed), GENERATOR_LABELS[activity]
+    for path in files:
+        with open(path, "rb") as f:
+            yield path, parse_file_content(f.read(), path), None
+
+
+def evaluate(variants, recordings):
+    """Per-variant windows, feature time, agreement with the first variant and accuracy"""
+    rows = [{"fraction": fraction, "predictor": p, "windows": 0, "seconds": 0.0, "agree": 0, "correct": 0,
+             "labelled": 0} for fraction, p in variants]
+    for name, data, label in recordings:
+        reference = None
+        for row in rows:
+            p = row["predictor"]
+            features, seconds = featurize(data, p.feature_columns)
+            names = np.array([p.activity_mapping.get(c, f"Unknown_{c}") for c in p.predict(features)])
+            reference = names if reference is None else reference
+            row["windows"] += len(names)
+            row["seconds"] += seconds
+            row["agree"] += int((names == reference).sum())
+            if label is not None:
+                row["labelled"] += len(names)
+                row["correct"] += int((names == label).sum())
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure accuracy vs. speed of pruned feature sets")
+    parser.add_argument("files", nargs="*", help="real recordings to include (agreement only)")
+    parser.add_argument("--model", default="har_predictor_complete.pkl")
+    parser.add_argument("--keep", default="1,0.75,0.5,0.25,0.1", help="fractions of the columns to keep")
+    parser.add_argument("--samples", type=int, default=20000, help="length of each synthetic recording")
+    parser.add_argument("--seeds", type=int, default=1, help="synthetic recordings per activity")
+    parser.add_argument("--rank", choices=("contribution", "weights"), default="contribution",
+                        help="rank columns by decision contribution on a calibration recording, or by weight")
+    parser.add_argument("--save", type=float, help="write the predictor keeping this fraction as an artifact")
+    parser.add_argument("--output", default="har_model_artifact_pruned")
+    args = parser.parse_args(argv)
+
+    predictor = joblib.load(args.model)
+    fractions = [1.0] + [f for f in map(float, args.keep.split(',')) if f < 1]
+    if args.save is not None and args.save < 1 and args.save not in fractions:
+        fractions.append(args.save)
+    calibration = None
+    if args.rank == "contribution":
+        data = generate_recording(args.samples, dict.fromkeys(GENERATORS, 1), CALIBRATION_SEED)
+        calibration, _ = featurize(data, None, repeat=1)
+    variants = build_variants(predictor, fractions, calibration)
+    rows = evaluate(variants, list(datasets(args.files, args.samples, args.seeds)))
+    n_nodes = len(get_signal_graph().featurized)
+
+    print("=" * 80)
+    print(f"{'keep':>6}{'columns':>9}{'signals':>9}{'µs/window':>11}{'speedup':>9}{'agree':>9}{'accuracy':>10}")
+    base = rows[0]["seconds"] / max(rows[0]["windows"], 1)
+    for r in rows:
+        p = r["predictor"]
+        graph = get_signal_graph(columns=p.feature_columns)
+        per_window = r["seconds"] / max(r["windows"], 1)
+        accuracy = f"{r['correct'] / r['labelled']:.2%}" if r["labelled"] else "-"
+        print(f"{r['fraction']:>6.0%}{p.n_features_in_:>9}{len(graph.featurized):>4}/{n_nodes:<4}"
+              f"{per_window * 1e6:>11.1f}{base / per_window:>8.2f}x{r['agree'] / max(r['windows'], 1):>9.2%}"
+              f"{accuracy:>10}")
+    print("=" * 80)
+
+    if args.save is not None:
+        fraction, chosen = next((f, p) for f, p in variants if f == min(args.save, 1.0))
+        save_artifact(chosen, args.output)
+        print(f"✓ Saved {chosen.n_features_in_}-column predictor ({fraction:.0%}) -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
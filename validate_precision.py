@@ -0,0 +1,151 @@
+"""
+Precision Validation for the float32 Pipeline
+Runs recordings through the feature pipeline in float64 and float32 and reports
+how often the predictions agree, how far decision values (or probabilities) and
+features move, and the time and peak memory of each path.
+
+    python validate_precision.py
+    python validate_precision.py recordings/*.csv --min-agreement 0.995
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmark import GENERATORS, generate_recording
+from har_io import parse_file_content
+from har_model import load_predictor
+from har_utils import FS, WIN_S, ar_coeffs_batch, get_signal_graph, process_sliding_windows
+
+HOP = WIN_S // 2
+
+
+def signal_columns(graph=None):
+    """Signal name (e.g. 'tBodyAcc-Y') of every feature column"""
+    graph = graph or get_signal_graph()
+    per_signal = graph.n_features // graph.n_signals
+    names = []
+    for name, _, _ in graph.nodes:
+        channels = graph.channels[name]
+        names += [name if channels == 1 else f"{name}-{'XYZ'[c]}" for c in range(channels)]
+    return [names[i // per_signal] for i in range(graph.n_features)]
+
+
+def featurize(data, dtype, columns=None):
+    """(features, seconds, peak traced bytes) for one recording at one precision"""
+    data = np.asarray(data[:, :6], dtype=dtype)
+    tracemalloc.start()
+    start = time.perf_counter()
+    features = process_sliding_windows(data[:, :3], data[:, 3:6], WIN_S, HOP, dtype=dtype, columns=columns)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return np.nan_to_num(features, nan=0.0), elapsed, peak
+
+
+def scores(predictor, X):
+    """Decision values where the predictor exposes them, else class probabilities (None without either)"""
+    if hasattr(predictor, "decision_function"):
+        return predictor.decision_function(X)
+    return predictor.predict_proba(X) if predictor.has_proba else None
+
+
+def compare(name, data, predictor):
+    # a pruned predictor reads only its feature_columns
+    columns = predictor.feature_columns
+    f64, t64, m64 = featurize(data, np.float64, columns)
+    f32, t32, m32 = featurize(data, np.float32, columns)
+    labels64, labels32 = predictor.predict(f64), predictor.predict(f32)
+    score64, score32 = scores(predictor, f64), scores(predictor, f32)
+    # feature error in units of the column's spread, so near-constant columns are not inflated
+    spread = f64.std(axis=0) + 1e-9
+    err = (np.abs(f32.astype(float) - f64) / spread).max(axis=0)
+    full_index = np.arange(f64.shape[1]) if columns is None else columns
+    return {
+        "name": name,
+        "windows": len(f64),
+        "agreement": float((labels64 == labels32).mean()) if len(f64) else 1.0,
+        "max_score_delta": float(np.abs(score32 - score64).max()) if len(f64) and score64 is not None else None,
+        "worst_column": int(full_index[err.argmax()]) if len(f64) else None,
+        "worst_column_error": float(err.max()) if len(f64) else 0.0,
+        "time64": t64, "time32": t32,
+        "peak64": m64, "peak32": m32,
+    }
+
+
+def ar_reference_error(order=4):
+    """Largest difference between the batched AR fit and np.linalg.lstsq on rank-deficient windows.
+
+    A pure sine satisfies an AR(2) recurrence and a period-2 signal x[t] = x[t-2],
+    so their order-4 lag matrices are singular in all but rounding; lstsq
+    returns the minimum-norm coefficients there and so must the batched fit.
+    """
+    t = np.arange(WIN_S) / FS
+    signals = np.stack([np.sin(2 * np.pi * 1.7 * t), np.arange(WIN_S) % 2.0, 9.8 + np.sin(2 * np.pi * 0.3 * t)])
+    fitted = ar_coeffs_batch(signals, order)
+    worst = 0.0
+    for x, coeffs in zip(signals, fitted):
+        X = np.column_stack([x[order - k:len(x) - k] for k in range(1, order + 1)])
+        reference = np.linalg.lstsq(X, x[order:], rcond=None)[0]
+        worst = max(worst, float(np.abs(coeffs - reference).max()))
+    return worst
+
+
+def datasets(files, samples, seeds):
+    """(name, recording) pairs: each synthetic activity, an even mix, then the given files"""
+    for seed in range(seeds):
+        for activity in GENERATORS:
+            yield f"{activity} (seed {seed})", generate_recording(samples, {activity: 1}, seed)
+        yield f"mixed (seed {seed})", generate_recording(samples, dict.fromkeys(GENERATORS, 1), seed)
+    for path in files:
+        with open(path, "rb") as f:
+            yield path, parse_file_content(f.read(), path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare float32 and float64 pipeline predictions")
+    parser.add_argument("files", nargs="*", help="real recordings to include")
+    parser.add_argument("--samples", type=int, default=20000, help="length of each synthetic recording")
+    parser.add_argument("--seeds", type=int, default=2, help="synthetic recordings per activity")
+    parser.add_argument("--artifact", default="har_model_artifact")
+    parser.add_argument("--model", default="har_predictor_complete.pkl")
+    parser.add_argument("--min-agreement", type=float, default=0.99, help="fail below this overall agreement")
+    args = parser.parse_args(argv)
+
+    predictor = load_predictor(args.artifact, args.model)
+    columns = signal_columns()
+    rows = [compare(name, data, predictor) for name, data in datasets(args.files, args.samples, args.seeds)]
+    # Δdec: largest change of a decision value; Δprob of a class probability for predictors without decision values
+    score = "Δdec" if hasattr(predictor, "decision_function") else "Δprob"
+
+    print("=" * 96)
+    print(f"{'recording':<30}{'windows':>8}{'agree':>9}{'max ' + score:>10}{'worst feature':>22}"
+          f"{'ms 64/32':>11}{'MB 64/32':>11}")
+    for r in rows:
+        worst = f"{columns[r['worst_column']]}:{r['worst_column']}" if r["worst_column"] is not None else "-"
+        delta = f"{r['max_score_delta']:.3f}" if r["max_score_delta"] is not None else "-"
+        print(f"{r['name']:<30}{r['windows']:>8}{r['agreement']:>9.2%}{delta:>10}"
+              f"{worst:>22}{r['time64'] * 1e3:>6.0f}/{r['time32'] * 1e3:<4.0f}"
+              f"{r['peak64'] / 2**20:>6.1f}/{r['peak32'] / 2**20:<4.1f}")
+
+    windows = sum(r["windows"] for r in rows)
+    agreement = sum(r["agreement"] * r["windows"] for r in rows) / windows if windows else 1.0
+    print("=" * 96)
+    print(f"Overall agreement: {agreement:.4%} over {windows} windows")
+    ar_error = ar_reference_error()
+    print(f"AR fit vs lstsq on sine / period-2 windows: max |Δ| {ar_error:.2e}")
+    if ar_error > 1e-6:
+        print("✗ AR coefficients differ from lstsq")
+        return 1
+    if agreement < args.min_agreement:
+        print(f"✗ Below --min-agreement {args.min_agreement:.2%}")
+        return 1
+    print("✓ float32 predictions match")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())